@@ -0,0 +1,239 @@
+"""Benchmarks for the mut8: Current hot paths on a synthetic SubPresets library.
+
+Builds a library of the requested size in a temporary directory, times library
+scanning and loading, single (fresh and memoized) and batch blends, generating one
+preset from DEFAULT.xml, template rendering and atomic output writing, plus GUI cold start (import and time to first paint, when a display is available), and
+prints the results as JSON (or writes them to --output) so runs can be compared across releases:
+
+    python3 benchmark.py --categories 4 --conditions 6 --presets 40 --parameters 300
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from uuid import UUID
+
+import numpy as np
+
+import effects_generator
+from effects_generator import category_template, condition_index, generate_variants, plan_blends
+from preset_core import PresetBatch, blend_groups, clear_caches, interpolate_presets_batch
+from preset_library import PresetCache, load_categories_and_conditions, load_factory_effects
+from preset_writer import write_atomic
+
+
+def synthesize_preset(name, parameters, rng, missing=0):
+    """Returns the XML text of a synthetic preset with `parameters` parameters, `missing` of them dropped."""
+    root = ET.Element("SubPreset", name=name, version="1")
+    ET.SubElement(root, "Meta", UUID=str(UUID(int=rng.getrandbits(128))), Author="benchmark")
+    ET.SubElement(
+        root, "Node_Properties",
+        SubPresetName=name,
+        PositiveDistType=str(rng.randint(0, 7)),
+        NegativeDistType=str(rng.randint(0, 7)),
+    )
+    params = ET.SubElement(root, "Parameters")
+    dropped = set(rng.sample(range(parameters), missing))
+    for i in range(parameters):
+        if i in dropped:
+            continue
+        unmapped = rng.random()
+        ET.SubElement(params, f"Param{i:04d}", unmapped_value=repr(unmapped), mapped_value=repr(unmapped * 20000.0))
+    ET.indent(root)
+    return ET.tostring(root, encoding='unicode', xml_declaration=True)
+
+
+def synthesize_library(base_dir, categories=3, conditions=4, presets=20, parameters=200, seed=0):
+    """Writes a SubPresets tree of Category/Condition/*.xml plus Category/User/DEFAULT.xml."""
+    rng = random.Random(seed)
+    for c in range(categories):
+        category = "Polar Distortion" if c == 0 else f"Category {c}"
+        user_dir = os.path.join(base_dir, category, "User")
+        os.makedirs(user_dir, exist_ok=True)
+        with open(os.path.join(user_dir, "DEFAULT.xml"), 'w') as f:
+            f.write(synthesize_preset("DEFAULT", parameters, rng))
+        for d in range(conditions):
+            condition_dir = os.path.join(base_dir, category, f"Condition {d}")
+            os.makedirs(condition_dir, exist_ok=True)
+            for p in range(presets):
+                # A few presets lack parameters, as older factory presets do
+                missing = rng.randint(1, 3) if p % 10 == 9 else 0
+                with open(os.path.join(condition_dir, f"Preset {p}.xml"), 'w') as f:
+                    f.write(synthesize_preset(f"Preset {p}", parameters, rng, missing))
+
+
+def measure(fn, repeat):
+    """Runs fn `repeat` times and returns timing statistics in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"best": min(times), "mean": statistics.fmean(times), "median": statistics.median(times), "repeat": repeat}
+
+
+def measure_startup(repeat):
+    """Times GUI cold start in fresh interpreters: importing main_app, and launch to first paint.
+
+    First paint needs a display; without one that entry records why it was skipped.
+    """
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+
+    def import_main_app():
+        subprocess.run([sys.executable, "-c", "import main_app"], cwd=app_dir, check=True)
+
+    results["startup_import"] = measure(import_main_app, repeat)
+
+    paints = []
+    env = dict(os.environ, MUT8_STARTUP_PROBE="1")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run = subprocess.run([sys.executable, "main_app.py"], cwd=app_dir, env=env, capture_output=True, text=True, timeout=60)
+        wall = time.perf_counter() - start
+        line = next((line for line in run.stdout.splitlines() if line.startswith("first_paint ")), None)
+        if line is None:
+            reason = run.stderr.strip().splitlines()[-1] if run.stderr.strip() else f"exit status {run.returncode}"
+            results["startup_first_paint"] = {"skipped": reason}
+            return results
+        paints.append((float(line.split()[1]), wall))
+    results["startup_first_paint"] = {
+        "best": min(paint for paint, _ in paints),
+        "median": statistics.median(paint for paint, _ in paints),
+        "process_best": min(wall for _, wall in paints),
+        "repeat": repeat,
+    }
+    return results
+
+
+def run_benchmarks(base_dir, repeat=5, batch_size=1000, variants=200):
+    """Times each stage against the library at base_dir and returns a results dict."""
+    results = {}
+    cache_path = os.path.join(base_dir, ".benchmark-cache.pickle")
+
+    results["library_scan"] = measure(lambda: load_categories_and_conditions(base_dir), repeat)
+    categories = load_categories_and_conditions(base_dir)
+
+    def load_cold():
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        load_factory_effects(base_dir, categories, PresetCache(cache_path))
+
+    results["library_load_cold"] = measure(load_cold, repeat)
+    results["library_load_warm"] = measure(
+        lambda: load_factory_effects(base_dir, categories, PresetCache(cache_path)), repeat
+    )
+    factory_effects = load_factory_effects(base_dir, categories, PresetCache(cache_path))
+
+    category = next(iter(categories))
+    condition = categories[category][0]
+    presets = factory_effects[category][condition]
+    xml_list = []
+    for preset in presets[:2]:
+        with open(preset.path, 'r') as f:
+            xml_list.append(f.read())
+
+    def blend_single():
+        clear_caches()
+        interpolate_presets_batch(xml_list, [[0.5, 0.5]])
+
+    results["blend_single"] = measure(blend_single, repeat)
+    # The same presets and weights again: a cache lookup and a render
+    results["blend_single_cached"] = measure(lambda: interpolate_presets_batch(xml_list, [[0.5, 0.5]]), repeat)
+
+    default_path = os.path.join(base_dir, category, "User", "DEFAULT.xml")
+
+    def generate_single():
+        # One generated preset from cold: DEFAULT.xml template, condition index, pick and blend, render
+        effects_generator.category_templates.clear()
+        effects_generator.condition_indexes.clear()
+        schema, template = category_template(category, default_path)
+        index = condition_index(category, condition, schema, presets)
+        _, blended, node_overrides = plan_blends(category, index, 1, np.random.default_rng(0))
+        for values, overrides in zip(blended, node_overrides):
+            template.render(values, name="benchmark", node_properties=overrides)
+
+    results["generate_single"] = measure(generate_single, repeat)
+    schema, _ = category_template(category, default_path)
+
+    # N-way blends of up to eight presets, with a group override and a discrete parameter
+    group = min(8, len(presets))
+    projected = np.stack([schema.project_record(preset) for preset in presets])
+    members = np.random.default_rng(0).integers(len(presets), size=(batch_size, group))
+    group_weights = np.random.default_rng(1).dirichlet(np.ones(group), size=batch_size)
+    overrides = {schema.tags[0][:-1] + "*": np.eye(group)[0]}
+    results["blend_groups"] = measure(
+        lambda: blend_groups(schema, projected[members], group_weights, overrides, discrete=[schema.tags[-1]], rule="vote"),
+        repeat,
+    )
+    results["blend_groups"].update(blends=batch_size, presets=group)
+
+    batch = PresetBatch(xml_list)
+    weights = np.random.default_rng(0).dirichlet(np.ones(len(batch)), size=batch_size)
+    results["blend_batch"] = measure(lambda: batch.blend(weights), repeat)
+    results["blend_batch"]["blends"] = batch_size
+
+    blended = batch.blend(weights[:1])[0]
+    results["render_template"] = measure(lambda: batch.render(blended), repeat)
+    output_path = os.path.join(base_dir, "benchmark_output.xml")
+    text = batch.render(blended)
+    results["write_atomic"] = measure(lambda: write_atomic(output_path, text), repeat)
+
+    output_dir = os.path.join(base_dir, category, "User")
+
+    def generate():
+        for name in os.listdir(output_dir):
+            if name.startswith("blended_"):
+                os.remove(os.path.join(output_dir, name))
+        generate_variants(base_dir, [(category, condition)], variants, seed=0, cache=PresetCache(cache_path))
+
+    results["generate_variants"] = measure(generate, max(1, repeat // 2))
+    results["generate_variants"]["presets"] = variants
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the mut8: Current hot paths.")
+    parser.add_argument("--categories", type=int, default=3)
+    parser.add_argument("--conditions", type=int, default=4)
+    parser.add_argument("--presets", type=int, default=20, help="Presets per condition.")
+    parser.add_argument("--parameters", type=int, default=200, help="Parameters per preset.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Weight rows in the batch blend.")
+    parser.add_argument("--variants", type=int, default=200, help="Presets written by the generate benchmark.")
+    parser.add_argument("--skip-startup", action="store_true", help="Skip the GUI cold-start benchmarks.")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout.")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="mut8-bench-") as base_dir:
+        synthesize_library(base_dir, args.categories, args.conditions, args.presets, args.parameters)
+        results = run_benchmarks(base_dir, args.repeat, args.batch_size, args.variants)
+    if not args.skip_startup:
+        results.update(measure_startup(args.repeat))
+
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
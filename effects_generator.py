@@ -0,0 +1,333 @@
+import os
+import random
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import profiling
+from preset_core import ParameterSchema, PresetTemplate, blend_groups, choose_discrete
+from preset_index import QUERY_CHUNK, PresetIndex
+from preset_library import PresetCache, load_condition, user_directory
+from preset_writer import ArchiveWriter, release_placeholders, reserve_paths, write_atomic
+
+# Variants handed to a worker process per task
+CHUNK_SIZE = 32
+
+# Rounds of redrawing pairs to replace duplicate blends before giving up
+DEDUPE_ROUNDS = 5
+
+# Random candidate blends scored per wanted result when exploring
+EXPLORE_CANDIDATES = 16
+
+# Node_Properties attributes a blend may change besides SubPresetName
+DISTORTION_KEYS = ("PositiveDistType", "NegativeDistType")
+
+# Schema and output template per category, rebuilt when that category's DEFAULT.xml changes
+category_templates = {}
+
+def load_category_template(default_path, node_keys=()):
+    """Reads a DEFAULT.xml into its parameter schema and precompiled output template."""
+    default_root = ET.parse(default_path).getroot()
+    schema = ParameterSchema.from_params(default_root.findall("Parameters/*"))
+    template = PresetTemplate(default_root, param_path="Parameters/*", rename=True, node_keys=node_keys)
+    return schema, template
+
+def category_template(category, default_path):
+    """Returns the cached (schema, template) of a category's DEFAULT.xml."""
+    mtime = os.stat(default_path).st_mtime_ns
+    cached = category_templates.get(category)
+    if cached is None or cached[0] != mtime:
+        # Only Polar Distortion blends set the distortion types
+        node_keys = DISTORTION_KEYS if category == "Polar Distortion" else ()
+        cached = category_templates[category] = (mtime, load_category_template(default_path, node_keys))
+    return cached[1]
+
+# Similarity index per category/condition, rebuilt when its presets or schema change
+condition_indexes = {}
+
+def condition_index(category, condition, schema, presets):
+    """Returns the PresetIndex of a condition's presets, projected onto the category schema."""
+    cached = condition_indexes.get((category, condition))
+    if (cached is None or cached.schema is not schema or len(cached.records) != len(presets)
+            or any(a is not b for a, b in zip(cached.records, presets))):
+        cached = condition_indexes[(category, condition)] = PresetIndex(schema, presets)
+    return cached
+
+def equal_weights(size, weights=None):
+    """Returns the weight row of a blend of `size` presets, equal unless given."""
+    if weights is None:
+        return np.full(size, 1.0 / size)
+    weights = np.asarray(weights, dtype=float)
+    if weights.shape != (size,):
+        raise ValueError(f"Expected {size} blend weights, got {len(weights)}.")
+    return weights
+
+def pick_blends(index, count, rng, pairing="random", dedupe=True, size=2, weights=None,
+                overrides=None, discrete=(), rule="random", jitter=0.0):
+    """Picks up to `count` groups of `size` presets and blends each group in one vectorized pass.
+
+    weights holds one weight per group member, the first being the random anchor preset;
+    overrides, discrete, rule and jitter are as in blend_groups. Groups whose blend
+    duplicates an existing preset or an earlier blend are redrawn for up to DEDUPE_ROUNDS
+    rounds. Returns the (blends x size) index array and the (blends x parameters x 2) blends.
+    """
+    projected = np.stack([index.schema.project_record(record) for record in index.records])
+    weights = equal_weights(size, weights)
+    groups = np.zeros((0, size), dtype=np.intp)
+    blended = np.zeros((0,) + projected.shape[1:])
+    for _ in range(DEDUPE_ROUNDS if dedupe else 1):
+        need = count - len(groups)
+        if need <= 0:
+            break
+        new_groups = index.pick_groups(need, size, rng, pairing)
+        row_weights = np.broadcast_to(weights, new_groups.shape)
+        new_blended = blend_groups(index.schema, projected[new_groups], row_weights, overrides, discrete, rule, rng, jitter)
+        groups = np.concatenate([groups, new_groups])
+        blended = np.concatenate([blended, new_blended])
+        if dedupe:
+            keep = ~index.duplicates(index.vectorize(blended))
+            groups, blended = groups[keep], blended[keep]
+    return groups, blended
+
+def explore_blends(index, count, rng, pairing="random", dedupe=True, size=2, weights=None, overrides=None,
+                   discrete=(), rule="random", jitter=0.0, candidates=EXPLORE_CANDIDATES, concentration=1.0):
+    """Blends `candidates` random groups per wanted result and keeps the `count` most novel.
+
+    Each candidate blends `size` presets picked by pairing, with convex weights drawn from
+    a Dirichlet distribution centred on weights (equal by default); lower concentration
+    gives more lopsided blends. Candidates are scored by their distance to the nearest
+    existing preset in chunks of QUERY_CHUNK, without rendering any XML; with dedupe,
+    near-duplicates are dropped. overrides, discrete, rule and jitter are as in blend_groups.
+    Returns the survivors' (groups, weights, blends, scores), best first.
+    """
+    projected = np.stack([index.schema.project_record(record) for record in index.records])
+    alpha = equal_weights(size, weights)
+    alpha = concentration * size * alpha / alpha.sum()
+    if not np.all(alpha > 0):
+        raise ValueError("Exploring needs positive blend weights and concentration.")
+
+    # Twice as many survivors as needed are kept, as some may turn out to be duplicates
+    keep = 2 * count
+    pool = None
+    total = count * candidates
+    for start in range(0, total, QUERY_CHUNK):
+        need = min(QUERY_CHUNK, total - start)
+        groups = index.pick_groups(need, size, rng, pairing)
+        row_weights = rng.dirichlet(alpha, size=need)
+        blended = blend_groups(index.schema, projected[groups], row_weights, overrides, discrete, rule, rng, jitter)
+        _, distances = index.query(index.vectorize(blended), 1)
+        chunk = (groups, row_weights, blended, distances[:, 0])
+        pool = chunk if pool is None else tuple(np.concatenate([a, b]) for a, b in zip(pool, chunk))
+        if len(pool[3]) > keep:
+            best = np.argpartition(-pool[3], keep - 1)[:keep]
+            pool = tuple(a[best] for a in pool)
+        profiling.count("candidates_scored", need)
+
+    groups, row_weights, blended, scores = pool
+    order = np.argsort(-scores, kind="stable")
+    if dedupe:
+        order = order[~index.duplicates(index.vectorize(blended[order]))]
+    order = order[:count]
+    return groups[order], row_weights[order], blended[order], scores[order]
+
+def blend_distortion_types(presets, groups, weights=None, rule="random", rng=None):
+    """Picks PositiveDistType and NegativeDistType for every group of presets at once.
+
+    weights is one weight row for all groups or one row per group. Returns one
+    Node_Properties override dict per group; groups with a preset lacking Node_Properties
+    get no overrides.
+    """
+    types = np.array([
+        [int((preset.node_properties or {}).get(key, 0)) for key in DISTORTION_KEYS] for preset in presets
+    ])
+    complete = np.array([preset.node_properties is not None for preset in presets])[groups].all(axis=1)
+    if np.ndim(weights) != 2:
+        weights = equal_weights(groups.shape[1], weights)
+    row_weights = np.broadcast_to(weights, groups.shape)
+    options = types[groups]
+    winners = choose_discrete(options, row_weights, rule, rng)
+    chosen = np.take_along_axis(options, winners[:, None, :], axis=1)[:, 0]
+    return [
+        {key: str(value) for key, value in zip(DISTORTION_KEYS, row)} if ok else {}
+        for ok, row in zip(complete.tolist(), chosen.tolist())
+    ]
+
+def plan_blends(category, index, count, rng, pairing="random", dedupe=True, explore=0, concentration=1.0, **options):
+    """Picks and blends up to `count` preset groups of one condition.
+
+    options are size, weights, overrides, discrete, rule and jitter as in pick_blends; the
+    rule also picks Polar Distortion's distortion types. With explore, each result is the
+    best of `explore` random candidates (see explore_blends). Returns (groups, blends,
+    Node_Properties overrides).
+    """
+    with profiling.timed("pick"):
+        if explore:
+            groups, weights, blended, _ = explore_blends(
+                index, count, rng, pairing, dedupe, candidates=explore, concentration=concentration, **options
+            )
+        else:
+            groups, blended = pick_blends(index, count, rng, pairing, dedupe, **options)
+            weights = options.get("weights")
+    if category == "Polar Distortion" and len(groups):
+        node_overrides = blend_distortion_types(index.records, groups, weights, options.get("rule", "random"), rng)
+    else:
+        node_overrides = [{} for _ in range(len(groups))]
+    return groups, blended, node_overrides
+
+def allocate_counters(existing_files, base_name, count):
+    """Returns the first `count` free counters for base_name, given a set of file names."""
+    counters = []
+    counter = 1
+    while len(counters) < count:
+        if f"{base_name}_{counter}.xml" not in existing_files:
+            counters.append(counter)
+        counter += 1
+    return counters
+
+def render_variants(template, variants):
+    """Worker task: renders variants through a compiled DEFAULT.xml template.
+
+    Each variant is (output_path, sub_preset_name, blended values, Node_Properties overrides).
+    Returns [(output_path, text)].
+    """
+    return [
+        (output_path, template.render(blended, name=sub_preset_name, node_properties=overrides))
+        for output_path, sub_preset_name, blended, overrides in variants
+    ]
+
+def write_variants(template, variants):
+    """Worker task: renders variants and writes each one atomically. Returns the written paths."""
+    written = []
+    for output_path, text in render_variants(template, variants):
+        write_atomic(output_path, text)
+        written.append(output_path)
+    return written
+
+def plan_variants(base_dir, category, conditions, count, cache, rng, summary, pairing="random", dedupe=True,
+                  archive=False, store=None, **options):
+    """Blends `count` variants per condition of one category and returns the worker tasks.
+
+    Presets come from the library folders, or from store (a PresetStore) if given.
+    Output files are reserved in User/ right away; with archive, variants are named as
+    archive members "<category>/<name>.xml" instead.
+    """
+    target_directory = user_directory(base_dir, category)
+    default_path = os.path.join(target_directory, "DEFAULT.xml")
+    if not os.path.exists(default_path):
+        summary["errors"].append(f"Default preset not found: {default_path}")
+        return []
+
+    schema, template = category_template(category, default_path)
+    existing_files = set(os.listdir(target_directory))
+
+    tasks = []
+    for condition in conditions:
+        if store is not None:
+            presets = store.load_condition(category, condition)
+        else:
+            presets = load_condition(base_dir, category, condition, cache)
+        if len(presets) < max(options.get("size", 2), 2):
+            summary["errors"].append(f"Not enough presets in category: {category}, condition: {condition}")
+            continue
+
+        index = condition_index(category, condition, schema, presets)
+        np_rng = np.random.default_rng(rng.getrandbits(64))
+        groups, blended, node_overrides = plan_blends(category, index, count, np_rng, pairing, dedupe, **options)
+        summary["skipped"] += count - len(groups)
+
+        base_name = f"blended_{category}_{condition}"
+        counters = allocate_counters(existing_files, base_name, len(groups))
+        if archive:
+            outputs = [(f"{category}/{base_name}_{counter}.xml", counter) for counter in counters]
+        else:
+            outputs = reserve_paths(target_directory, base_name, counters)
+        variants = []
+        for (output_path, counter), values, overrides in zip(outputs, blended, node_overrides):
+            variants.append((output_path, f"{base_name}_{counter}", values, overrides))
+        for start in range(0, len(variants), CHUNK_SIZE):
+            tasks.append((template, variants[start:start + CHUNK_SIZE]))
+    return tasks
+
+def generate_variants(base_dir, jobs, count, workers=None, seed=None, progress=None, cache=None,
+                      pairing="random", dedupe=True, archive=None, store=None, **options):
+    """Generates `count` blended presets for every (category, condition) in jobs.
+
+    base_dir is a library root or a list of roots; each condition blends the presets of
+    every root that has it, or those of store (a PresetStore) if given. DEFAULT.xml and
+    the User/ output folders always come from base_dir. Presets are grouped by `pairing`
+    (see PAIRINGS) and blended according to options (size, weights, overrides, discrete,
+    rule, jitter; see pick_blends), or explored with explore and concentration (see
+    explore_blends); with
+    dedupe, blends that nearly duplicate a factory preset or each other are dropped.
+
+    Output file names are reserved up front and each file is written atomically by a
+    process pool, into the category's User/ folder or, given an archive path, into one zip
+    archive written by this process. progress(done, total) is called as presets are
+    finished. Returns a summary dict with the written paths (or archive members), errors,
+    number of skipped duplicates, the archive path and elapsed seconds.
+    """
+    size = options.get("size", 2)
+    weights = equal_weights(size, options.get("weights"))
+    if options.get("explore") and (np.any(weights <= 0) or options.get("concentration", 1.0) <= 0):
+        raise ValueError("Exploring needs positive blend weights and concentration.")
+    for pattern, group_weights in (options.get("overrides") or {}).items():
+        if len(group_weights) != size:
+            raise ValueError(f"Expected {size} weights for parameters {pattern!r}, got {len(group_weights)}.")
+
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    if cache is None:
+        cache = PresetCache()
+    summary = {"written": [], "errors": [], "skipped": 0, "archive": None, "elapsed": 0.0}
+
+    conditions_by_category = {}
+    for category, condition in jobs:
+        conditions_by_category.setdefault(category, []).append(condition)
+
+    tasks = []
+    for category, conditions in conditions_by_category.items():
+        tasks.extend(plan_variants(
+            base_dir, category, conditions, count, cache, rng, summary, pairing, dedupe, bool(archive), store,
+            **options
+        ))
+    cache.save()
+
+    total = sum(len(variants) for _, variants in tasks)
+    done = 0
+    if tasks:
+        worker = render_variants if archive else write_variants
+        writer = ArchiveWriter(archive) if archive else None
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Workers report their own stats, merged here
+                futures = {profiling.submit(pool, worker, *task): task for task in tasks}
+                for future in as_completed(futures):
+                    variants = futures[future][1]
+                    try:
+                        result = profiling.result(future)
+                        if writer is not None:
+                            for name, text in result:
+                                writer.add(name, text)
+                            result = [name for name, _ in result]
+                        summary["written"].extend(result)
+                    except Exception as e:
+                        summary["errors"].append(f"Failed to write presets: {e}")
+                        if writer is None:
+                            release_placeholders([variant[0] for variant in variants])
+                    done += len(variants)
+                    if progress is not None:
+                        progress(done, total)
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            else:
+                release_placeholders([variant[0] for _, variants in tasks for variant in variants])
+            raise
+        if writer is not None:
+            writer.close()
+            summary["archive"] = archive
+
+    summary["elapsed"] = time.perf_counter() - start
+    return summary
@@ -0,0 +1,105 @@
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import ttk
+
+from preset_core import load_batch
+
+# Quiet time after the last slider move before the preview recomputes
+PREVIEW_DELAY_MS = 30
+POLL_MS = 15
+
+
+class LivePreview(tk.Frame):
+    """Table of blended parameter values that follows the weight sliders without blocking Tk.
+
+    Loaded presets are parsed into a PresetBatch on a worker thread, or taken from the
+    batch cache if the same presets were loaded before. Slider moves are
+    debounced, each blend runs on the same worker, and moves that arrive while a blend is
+    running are coalesced into one follow-up blend. Only rows whose text changed are redrawn.
+    """
+
+    def __init__(self, master, get_weights, height=8):
+        super().__init__(master)
+        self.get_weights = get_weights
+        self.batch = None
+        self.worker = ThreadPoolExecutor(max_workers=1)
+        self.scheduled = None
+        self.computing = False
+        self.stale = False
+        self.shown = {}
+
+        self.table = ttk.Treeview(self, columns=("unmapped", "mapped"), height=height)
+        self.table.heading("#0", text="Parameter")
+        self.table.heading("unmapped", text="Unmapped")
+        self.table.heading("mapped", text="Mapped")
+        self.table.column("#0", width=140)
+        self.table.column("unmapped", width=90, anchor="e")
+        self.table.column("mapped", width=90, anchor="e")
+        scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.table.yview)
+        self.table.configure(yscrollcommand=scrollbar.set)
+        self.table.pack(side=tk.LEFT, expand=1, fill="both")
+        scrollbar.pack(side=tk.RIGHT, fill="y")
+
+    def run(self, task, on_done):
+        """Runs task on the worker thread and hands its result to on_done on the Tk thread."""
+        self.poll(self.worker.submit(task), on_done)
+
+    def poll(self, future, on_done):
+        if not future.done():
+            self.after(POLL_MS, self.poll, future, on_done)
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Warning: Preview failed: {e}")
+            self.computing = False
+            return
+        on_done(result)
+
+    def set_presets(self, xml_list):
+        """Rebuilds the parameter matrix in the background after the loaded presets change."""
+        self.batch = None
+        xml_list = list(xml_list)
+        if xml_list:
+            self.run(lambda: load_batch(xml_list), self.show_batch)
+
+    def show_batch(self, batch):
+        self.batch = batch
+        self.shown = {}
+        self.table.delete(*self.table.get_children())
+        for i, tag in enumerate(batch.schema.tags):
+            self.table.insert("", tk.END, iid=str(i), text=tag)
+        self.refresh()
+
+    def schedule(self, *args):
+        """Requests a recompute once the sliders have been still for PREVIEW_DELAY_MS."""
+        if self.scheduled is not None:
+            self.after_cancel(self.scheduled)
+        self.scheduled = self.after(PREVIEW_DELAY_MS, self.refresh)
+
+    def refresh(self):
+        self.scheduled = None
+        if self.batch is None:
+            return
+        if self.computing:
+            self.stale = True
+            return
+        batch = self.batch
+        weights = self.get_weights(len(batch))
+        self.computing = True
+        self.run(lambda: batch.blend(weights)[0], lambda blended: self.show_values(batch, blended))
+
+    def show_values(self, batch, blended):
+        self.computing = False
+        if batch is not self.batch:
+            # The presets changed while this blend was running
+            self.refresh()
+            return
+        for i, (unmapped, mapped) in enumerate(blended.tolist()):
+            text = (f"{unmapped:.4g}", f"{mapped:.4g}")
+            if self.shown.get(i) != text:
+                self.table.item(str(i), values=text)
+                self.shown[i] = text
+        if self.stale:
+            self.stale = False
+            self.refresh()
@@ -1,7 +1,19 @@
+import time
+
+# Cold-start clock, started before tkinter and the tabs are imported
+STARTED = time.perf_counter()
+
+import importlib
+import os
 import tkinter as tk
 from tkinter import ttk, messagebox
-from preset_interpolator import PresetInterpolatorApp
-from preset_generator import PresetGeneratorApp
+import profiling
+
+# Tabs as (label, module, app class); a module is imported when its tab is first shown
+TABS = (
+    ("mut8 Preset", "preset_interpolator", "PresetInterpolatorApp"),
+    ("mut8 Effects", "preset_generator", "PresetGeneratorApp"),
+)
 
 
 class MainApp(tk.Tk):
@@ -32,23 +44,60 @@ class MainApp(tk.Tk):
         )
         help_button.place(relx=0.97, rely=0.02, anchor="ne")  # Position top-right
 
-        # Create tab control
-        tab_control = ttk.Notebook(self)
+        # Stats button opens the profiling panel
+        tk.Button(self, text="Stats", command=self.show_stats).place(relx=0.03, rely=0.02, anchor="nw")
+        self.stats_window = None
 
-        # Create tabs
-        interpolator_tab = tk.Frame(tab_control)
-        generator_tab = tk.Frame(tab_control)
+        # Create tab control with empty tabs; each app is built the first time its tab is selected
+        self.tab_control = ttk.Notebook(self)
+        self.tabs = {}
+        for label, module, app_class in TABS:
+            frame = tk.Frame(self.tab_control)
+            self.tab_control.add(frame, text=label)
+            self.tabs[str(frame)] = (frame, module, app_class)
+        self.built_tabs = set()
+        self.tab_control.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.after_idle(self.on_tab_changed, None)  # The initially selected tab
 
-        # Add apps to tabs
-        PresetInterpolatorApp(interpolator_tab).pack(expand=1, fill="both", padx=10, pady=10)
-        PresetGeneratorApp(generator_tab).pack(expand=1, fill="both", padx=10, pady=10)
+        # Pack tab control into the main window
+        self.tab_control.pack(expand=1, fill="both", padx=10, pady=10)
 
-        # Add tabs to the tab control with updated labels
-        tab_control.add(interpolator_tab, text="mut8 Preset")
-        tab_control.add(generator_tab, text="mut8 Effects")
+        # Time to first paint, from STARTED to the window being mapped and drawn
+        self.startup_seconds = None
+        self.bind("<Map>", self.on_first_map)
 
-        # Pack tab control into the main window
-        tab_control.pack(expand=1, fill="both", padx=10, pady=10)
+    def on_tab_changed(self, event):
+        selected = str(self.tab_control.select())
+        if selected and selected not in self.built_tabs:
+            self.built_tabs.add(selected)
+            # Let the window draw first, then build the tab
+            self.after_idle(self.build_tab, selected)
+
+    def build_tab(self, selected):
+        frame, module, app_class = self.tabs[selected]
+        try:
+            with profiling.timed("build_tab"):
+                app = getattr(importlib.import_module(module), app_class)(frame)
+                app.pack(expand=1, fill="both", padx=10, pady=10)
+        except Exception as e:
+            # Try again the next time the tab is selected
+            self.built_tabs.discard(selected)
+            messagebox.showerror("Error", f"Failed to open {module}: {e}")
+
+    def on_first_map(self, event):
+        # <Map> also reaches the root's binding from every child widget
+        if event.widget is self:
+            self.unbind("<Map>")
+            self.after_idle(self.record_first_paint)
+
+    def record_first_paint(self):
+        self.update_idletasks()
+        self.startup_seconds = time.perf_counter() - STARTED
+        profiling.record("first_paint", self.startup_seconds)
+        if os.environ.get("MUT8_STARTUP_PROBE"):
+            # Used by benchmark.py: report the metric and exit
+            print(f"first_paint {self.startup_seconds:.6f}", flush=True)
+            self.after(0, self.destroy)
 
     def center_window(self):
         """Center the application window on the screen."""
@@ -61,6 +110,12 @@ class MainApp(tk.Tk):
         y = (screen_height // 2) - (500 // 2)
         self.geometry(f"400x500+{x}+{y}")
 
+    def show_stats(self):
+        """Open (or raise) the profiling stats panel."""
+        if self.stats_window is None or not self.stats_window.winfo_exists():
+            self.stats_window = StatsWindow(self)
+        self.stats_window.lift()
+
     def show_help(self):
         """Show instructions and credits."""
         messagebox.showinfo(
@@ -75,6 +130,52 @@ class MainApp(tk.Tk):
         )
 
 
+
+class StatsWindow(tk.Toplevel):
+    """Shows the profiling counters and per-stage timings, refreshed while open."""
+
+    REFRESH_MS = 1000
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.title("mut8: Current - Stats")
+
+        controls = tk.Frame(self)
+        controls.pack(fill="x", padx=10, pady=5)
+        self.enabled_var = tk.BooleanVar(value=profiling.enabled)
+        tk.Checkbutton(controls, text="Collect stats", variable=self.enabled_var, command=self.toggle).pack(side=tk.LEFT)
+        tk.Button(controls, text="Reset", command=self.reset).pack(side=tk.RIGHT)
+
+        self.text = tk.Text(self, width=110, height=20, font=("Courier", 10), wrap="none")
+        self.text.pack(expand=1, fill="both", padx=10, pady=(0, 10))
+        self.refresh_id = None
+        # Closing from the title bar must go through destroy() so the refresh is cancelled
+        self.protocol("WM_DELETE_WINDOW", self.destroy)
+        self.refresh()
+
+    def toggle(self):
+        profiling.enable(self.enabled_var.get())
+
+    def reset(self):
+        profiling.reset()
+        self.refresh()
+
+    def refresh(self):
+        report = profiling.format_report() if profiling.enabled or profiling.stages else "Stats collection is off."
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", report)
+        # Only one refresh stays scheduled, also when Reset refreshes early
+        if self.refresh_id is not None:
+            self.after_cancel(self.refresh_id)
+        self.refresh_id = self.after(self.REFRESH_MS, self.refresh)
+
+    def destroy(self):
+        if self.refresh_id is not None:
+            self.after_cancel(self.refresh_id)
+            self.refresh_id = None
+        super().destroy()
+
+
 if __name__ == "__main__":
     app = MainApp()
     app.mainloop()
@@ -0,0 +1,309 @@
+"""Headless command line for mut8: Current.
+
+Runs the interpolation core without importing tkinter, so it works on build machines
+without a display. Examples:
+
+    python3 mut8_cli.py blend lead1.xml lead2.xml --weights 0.3 0.7 -o lead_mix.xml
+    python3 mut8_cli.py sweep lead1.xml lead2.xml --steps 16 -o morph/lead_{step}.xml
+    python3 mut8_cli.py manifest pack.json --workers 8
+    python3 mut8_cli.py --profile manifest pack.json
+    python3 mut8_cli.py generate --library ./SubPresets --category "Polar Distortion" --count 200
+    python3 mut8_cli.py generate --library ./SubPresets --category "Polar Distortion" --pairing different
+    python3 mut8_cli.py generate --library ./Factory --library ./ArtistPacks --category "Polar Distortion"
+    python3 mut8_cli.py generate --category Filter --count 5000 --archive filter_pack.zip
+    python3 mut8_cli.py generate --category Filter --size 3 --weights 2 1 1 --group "Cutoff*=1,0,0" --rule vote
+    python3 mut8_cli.py generate --category Filter --count 20 --size 4 --explore 200 --jitter 0.3 --seed 7
+    python3 mut8_cli.py export-store --library ./SubPresets library.store
+    python3 mut8_cli.py generate --library ./SubPresets --store library.store --category Filter --count 500
+    python3 mut8_cli.py serve --library ./SubPresets --socket /tmp/mut8current.sock
+
+A JSON manifest is a list of jobs (or {"jobs": [...]}) such as
+{"inputs": ["a.xml", "b.xml"], "weights": [0.5, 0.5], "output": "out.xml"} or
+{"inputs": ["a.xml", "b.xml"], "steps": 8, "easing": "smoothstep", "output": "morph/ab_{step}.xml"}.
+Blend jobs may add "groups" ({"Filter*": [0.9, 0.1]}: weights for the parameters matching
+a pattern), "discrete" (patterns of parameters that take one input's value rather than
+an average) and "rule" (random, vote or nearest: how that input is chosen).
+Sweeps are streamed to disk one step at a time. A CSV manifest has the columns
+inputs, weights, steps, easing and output, with multiple inputs or weights
+separated by ";". Relative paths are resolved against the manifest's directory.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import profiling
+from preset_core import DISCRETE_RULES, EASINGS, load_batch, normalize_weights, write_sweep
+from preset_index import PAIRINGS
+from preset_writer import write_atomic
+
+
+def read_text(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+
+def run_job(job):
+    """Runs one blend or sweep job and returns the paths it wrote."""
+    xml_list = [read_text(path) for path in job["inputs"]]
+    steps = int(job.get("steps") or 0)
+    if steps:
+        return write_sweep(xml_list, steps, job["output"], job.get("easing", "linear"))
+
+    batch = load_batch(xml_list)
+    # Weights are relative, as in generate: --weights 2 1 means two thirds and one third
+    weights = normalize_weights(job.get("weights") or [1.0] * len(batch))
+    blended = batch.blend_cached(weights, job.get("groups"), job.get("discrete", ()), job.get("rule", "random"))
+    write_atomic(job["output"], batch.render(blended[0]), make_dirs=True)
+    return [job["output"]]
+
+
+def load_manifest(path):
+    """Reads a JSON or CSV manifest into a list of job dicts with resolved paths."""
+    base = os.path.dirname(os.path.abspath(path))
+    if path.lower().endswith(".csv"):
+        jobs = []
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                job = {
+                    "inputs": [item.strip() for item in row["inputs"].split(";") if item.strip()],
+                    "output": row["output"].strip(),
+                }
+                if row.get("weights", "").strip():
+                    job["weights"] = [float(item) for item in row["weights"].split(";")]
+                if row.get("steps", "").strip():
+                    job["steps"] = int(row["steps"])
+                if row.get("easing", "").strip():
+                    job["easing"] = row["easing"].strip()
+                jobs.append(job)
+    else:
+        with open(path, 'r') as f:
+            jobs = json.load(f)
+        if isinstance(jobs, dict):
+            jobs = jobs["jobs"]
+
+    for job in jobs:
+        job["inputs"] = [os.path.join(base, item) for item in job["inputs"]]
+        job["output"] = os.path.join(base, job["output"])
+    return jobs
+
+
+def run_jobs(jobs, workers=None):
+    """Runs jobs across a process pool; returns (written paths, error messages)."""
+    written, errors = [], []
+    if workers == 1 or len(jobs) <= 1:
+        results = []
+        for job in jobs:
+            try:
+                results.append(run_job(job))
+            except Exception as e:
+                results.append(e)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Workers report their own stats, merged here
+            futures = [profiling.submit(pool, run_job, job) for job in jobs]
+            results = []
+            for future in futures:
+                try:
+                    results.append(profiling.result(future))
+                except Exception as e:
+                    results.append(e)
+
+    for job, result in zip(jobs, results):
+        if isinstance(result, Exception):
+            errors.append(f"{job.get('output')}: {result}")
+        else:
+            written.extend(result)
+    return written, errors
+
+
+def report(written, errors):
+    for error in errors:
+        print(f"Error: {error}", file=sys.stderr)
+    print(f"Created {len(written)} presets ({len(errors)} failed).")
+    return 1 if errors else 0
+
+
+def parse_group(text):
+    """Parses a PATTERN=W1,W2,... group weight option into (pattern, weights)."""
+    pattern, separator, weights = text.rpartition("=")
+    if not separator or not pattern:
+        raise argparse.ArgumentTypeError(f"Expected PATTERN=W1,W2,...: {text}")
+    try:
+        return pattern, [float(weight) for weight in weights.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid weights in {text}")
+
+
+def add_blend_arguments(parser):
+    parser.add_argument("--group", type=parse_group, action="append", metavar="PATTERN=W1,W2,...",
+                        help="Weights for the parameters whose name matches PATTERN (repeatable; later groups win).")
+    parser.add_argument("--discrete", action="append", default=[], metavar="PATTERN",
+                        help="Parameters that take one preset's value instead of an average (repeatable).")
+    parser.add_argument("--rule", choices=DISCRETE_RULES, default="random",
+                        help="How discrete values and distortion types are chosen.")
+
+
+def command_blend(args):
+    job = {
+        "inputs": args.inputs, "weights": args.weights, "output": args.output,
+        "groups": dict(args.group or []), "discrete": args.discrete, "rule": args.rule,
+    }
+    return report(*run_jobs([job]))
+
+
+def command_sweep(args):
+    job = {"inputs": args.inputs, "steps": args.steps, "output": args.output, "easing": args.easing}
+    return report(*run_jobs([job]))
+
+
+def command_manifest(args):
+    return report(*run_jobs(load_manifest(args.manifest), args.workers))
+
+
+def command_generate(args):
+    # Imported here so the blend/sweep commands do not pay for the library modules
+    from effects_generator import generate_variants
+    from preset_library import load_categories_and_conditions
+
+    store = None
+    if args.store:
+        from preset_store import PresetStore
+        store = PresetStore(args.store)
+        conditions = args.condition or store.categories_and_conditions().get(args.category, [])
+    else:
+        conditions = args.condition or load_categories_and_conditions(args.library).get(args.category, [])
+    if not conditions:
+        print(f"Error: No conditions found for category {args.category!r}.", file=sys.stderr)
+        return 2
+    jobs = [(args.category, condition) for condition in conditions]
+    try:
+        summary = generate_variants(
+            args.library, jobs, args.count, workers=args.workers, seed=args.seed, store=store,
+            pairing=args.pairing, dedupe=not args.allow_duplicates, size=args.size, weights=args.weights,
+            overrides=dict(args.group or []), discrete=args.discrete, rule=args.rule, archive=args.archive,
+            explore=args.explore, concentration=args.concentration, jitter=args.jitter,
+        )
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    if summary["skipped"]:
+        print(f"Skipped {summary['skipped']} near-duplicate blends.")
+    return report(summary["written"], summary["errors"])
+
+
+def command_export_store(args):
+    import numpy as np
+    from preset_library import load_categories_and_conditions, load_factory_effects
+    from preset_store import export_store
+
+    categories = load_categories_and_conditions(args.library)
+    if args.category:
+        categories = {category: categories.get(category, []) for category in args.category}
+    count = export_store(args.output, load_factory_effects(args.library, categories),
+                         dtype=np.float32 if args.float32 else np.float64)
+    print(f"Exported {count} presets to {args.output}")
+    return 0
+
+
+def command_serve(args):
+    from preset_service import serve
+
+    store = None
+    if args.store:
+        from preset_store import PresetStore
+        store = PresetStore(args.store)
+    try:
+        serve(args.library, store, args.socket, args.host, args.port, args.workers,
+              ready=lambda address: print(f"Listening on {address}", flush=True))
+    except (RuntimeError, OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="mut8_cli", description="Headless preset interpolation for mut8: Current.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print per-stage timings and counters to stderr when the command finishes.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    blend = commands.add_parser("blend", help="Blend presets with weights into one output file.")
+    blend.add_argument("inputs", nargs="+", help="Input preset XML files.")
+    blend.add_argument("--weights", type=float, nargs="+", help="One relative weight per input (default: equal weights).")
+    blend.add_argument("-o", "--output", default="interpolated.xml", help="Output XML file.")
+    add_blend_arguments(blend)
+    blend.set_defaults(func=command_blend)
+
+    sweep = commands.add_parser("sweep", help="Write a morph sequence through the inputs in order.")
+    sweep.add_argument("inputs", nargs="+", help="Input preset XML files (at least two).")
+    sweep.add_argument("--steps", type=int, required=True, help="Number of steps, including both ends.")
+    sweep.add_argument("-o", "--output", default="morph", help="Output directory or pattern containing {step}.")
+    sweep.add_argument("--easing", choices=sorted(EASINGS), default="linear", help="Easing curve of the sweep.")
+    sweep.set_defaults(func=command_sweep)
+
+    manifest = commands.add_parser("manifest", help="Run every job of a JSON or CSV manifest.")
+    manifest.add_argument("manifest", help="Manifest file (.json or .csv).")
+    manifest.add_argument("--workers", type=int, help="Worker processes (default: one per core).")
+    manifest.set_defaults(func=command_manifest)
+
+    generate = commands.add_parser("generate", help="Generate blended effect presets into a SubPresets library.")
+    generate.add_argument("--library", action="append",
+                          help="SubPresets library root (repeatable; default: MUT8_LIBRARY_ROOTS or the factory library).")
+    generate.add_argument("--category", required=True, help="Category to generate for.")
+    generate.add_argument("--condition", action="append", help="Condition to blend from (repeatable; default: all).")
+    generate.add_argument("--count", type=int, default=1, help="Presets to generate per condition.")
+    generate.add_argument("--seed", type=int, help="Random seed for reproducible runs.")
+    generate.add_argument("--workers", type=int, help="Worker processes (default: one per core).")
+    generate.add_argument("--pairing", choices=PAIRINGS, default="random",
+                          help="Blend random pairs, similar presets or very different ones.")
+    generate.add_argument("--allow-duplicates", action="store_true",
+                          help="Keep blends that nearly duplicate a factory preset or each other.")
+    generate.add_argument("--archive", metavar="ZIP", help="Write all presets into one zip archive instead of User/.")
+    generate.add_argument("--size", type=int, default=2, help="Presets blended into each variant.")
+    generate.add_argument("--weights", type=float, nargs="+", help="One weight per blended preset (default: equal).")
+    generate.add_argument("--explore", type=int, default=0, metavar="N",
+                          help="Score N random blends per preset and keep the most novel (default: off).")
+    generate.add_argument("--concentration", type=float, default=1.0,
+                          help="With --explore, how closely random weights follow --weights; lower is more lopsided.")
+    generate.add_argument("--jitter", type=float, default=0.0,
+                          help="Vary the blend weights per parameter by this random spread, e.g. 0.3.")
+    generate.add_argument("--store", help="Blend presets from a store written by export-store instead of parsing the library.")
+    add_blend_arguments(generate)
+    generate.set_defaults(func=command_generate)
+
+    export = commands.add_parser("export-store", help="Export the parsed library as a memory-mapped preset store.")
+    export.add_argument("output", help="Store folder to write (replaced if it exists).")
+    export.add_argument("--library", action="append",
+                        help="SubPresets library root (repeatable; default: MUT8_LIBRARY_ROOTS or the factory library).")
+    export.add_argument("--category", action="append", help="Category to export (repeatable; default: all).")
+    export.add_argument("--float32", action="store_true", help="Store values as float32, halving the store size.")
+    export.set_defaults(func=command_export_store)
+
+    serve = commands.add_parser("serve", help="Run a local blend service that keeps presets parsed between requests.")
+    serve.add_argument("--library", action="append",
+                       help="SubPresets library root for generate requests (repeatable; default: MUT8_LIBRARY_ROOTS or the factory library).")
+    serve.add_argument("--store", help="Preset store for generate requests, as in generate --store.")
+    serve.add_argument("--socket", help="Unix socket to listen on (default: mut8current.sock in the temp folder).")
+    serve.add_argument("--port", type=int, help="Listen on this TCP port instead of a Unix socket.")
+    serve.add_argument("--host", default="127.0.0.1", help="Loopback address to listen on with --port.")
+    serve.add_argument("--workers", type=int, help="Worker processes for generate requests (default: one per core).")
+    serve.set_defaults(func=command_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.profile:
+        profiling.enable()
+    try:
+        return args.func(args)
+    finally:
+        if args.profile:
+            print(profiling.format_report(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,610 @@
+import copy
+import fnmatch
+import hashlib
+import io
+import os
+import re
+import sys
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from itertools import chain
+from uuid import uuid4
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+import profiling
+from preset_writer import write_atomic
+
+# Attributes blended on every parameter, in matrix order (last axis of the value arrays)
+VALUE_KEYS = ("unmapped_value", "mapped_value")
+
+
+def read_parameter_values(params):
+    """Reads a (parameters x 2) array of unmapped/mapped values, NaN where a value is unreadable."""
+    values = np.full((len(params), len(VALUE_KEYS)), np.nan)
+    for i, param in enumerate(params):
+        for j, key in enumerate(VALUE_KEYS):
+            try:
+                values[i, j] = float(param.get(key, '0'))
+            except ValueError:
+                pass
+    return values
+
+
+# Bytes fed to the pull parser between reads of its events
+PARSE_CHUNK_SIZE = 64 * 1024
+
+
+def parse_values(strings):
+    """Converts attribute strings to floats in one pass, NaN where a value is unreadable."""
+    try:
+        return np.array(strings, dtype=float)
+    except ValueError:
+        values = []
+        for text in strings:
+            try:
+                values.append(float(text))
+            except ValueError:
+                values.append(float('nan'))
+        return np.array(values, dtype=float)
+
+
+def extract_preset(source, root_parameters_only=False):
+    """Pull-parses a preset, reading only the fields the blenders need.
+
+    source is a path or a binary/text file object. Reads the root name, the Meta UUID,
+    the first Node_Properties attributes and the unmapped/mapped values of every
+    Parameters child (only the root's own Parameters if root_parameters_only), in document
+    order like findall('.//Parameters/*'). Each Parameters group is read in one pass when
+    it closes and then cleared, so the parameter elements never accumulate into a full tree;
+    groups are put back in the order they opened.
+
+    Returns (name, uuid, node_properties, tags, values).
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    groups = []
+    opened = {}  # open Parameters element -> its number in document order
+    started = 0
+    uuid = node_properties = None
+    element = None
+
+    def read_events():
+        nonlocal uuid, node_properties, element, started
+        for event, element in parser.read_events():
+            tag = element.tag
+            if event == "start":
+                if tag == "Parameters":
+                    opened[element] = started
+                    started += 1
+            elif tag == "Parameters":
+                params = list(element)
+                # Nested groups close first, so each group keeps the number it opened with
+                groups.append((
+                    opened.pop(element),
+                    element,
+                    [sys.intern(param.tag) for param in params],
+                    [param.get(key, '0') for param in params for key in VALUE_KEYS],
+                ))
+                element.clear()
+            elif tag == "Node_Properties":
+                if node_properties is None:
+                    node_properties = dict(element.attrib)
+            elif tag == "Meta":
+                if uuid is None:
+                    uuid = element.get("UUID")
+
+    timer = profiling.timed("parse")
+    size = 0
+    f = source if hasattr(source, "read") else open(source, "rb")
+    try:
+        with timer:
+            while True:
+                chunk = f.read(PARSE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                parser.feed(chunk)
+                read_events()
+            parser.close()
+            read_events()
+    finally:
+        if f is not source:
+            f.close()
+    profiling.count("presets_parsed")
+    profiling.count("bytes_parsed", size)
+
+    # The root element closes last
+    root = element
+    groups.sort(key=lambda group: group[0])
+    if root_parameters_only:
+        direct = {id(child) for child in root}
+        groups = [group for group in groups if id(group[1]) in direct]
+    tags = tuple(tag for _, _, group_tags, _ in groups for tag in group_tags)
+    strings = [text for _, _, _, group_strings in groups for text in group_strings]
+    values = parse_values(strings).reshape(len(tags), len(VALUE_KEYS))
+    return root.get("name"), uuid, node_properties, tags, values
+
+
+def parameter_keys(tags):
+    """Keys parameters by tag and occurrence, so tags repeated across Parameters groups stay distinct."""
+    seen = {}
+    keys = []
+    for tag in tags:
+        occurrence = seen.get(tag, 0)
+        seen[tag] = occurrence + 1
+        keys.append((tag, occurrence))
+    return keys
+
+
+class ParameterSchema:
+    """Tag-to-column index for one parameter layout, with fallback values for missing parameters.
+
+    Presets are projected onto the schema by parameter name, so parameter order does not
+    matter. Parameters the schema lacks are dropped; parameters a preset lacks, or whose
+    values are unreadable, take the schema's default values.
+    """
+
+    def __init__(self, tags, defaults):
+        self.tags = tuple(tags)
+        self.defaults = defaults
+        self.index = {key: i for i, key in enumerate(parameter_keys(self.tags))}
+        self.projections = {}
+
+    @classmethod
+    def from_params(cls, params):
+        """Builds a schema from template parameter elements, using their values as defaults."""
+        return cls([param.tag for param in params], read_parameter_values(params))
+
+    def __len__(self):
+        return len(self.tags)
+
+    def compare(self, tags):
+        """Returns the (missing, extra) parameter tags of a preset relative to the schema."""
+        keys = parameter_keys(tags)
+        present = set(keys)
+        missing = [tag for tag, key in zip(self.tags, self.index) if key not in present]
+        extra = [tag for tag, key in zip(tags, keys) if key not in self.index]
+        return missing, extra
+
+    def project(self, tags, values):
+        """Aligns a preset's tags and (parameters x 2) values onto the schema's columns."""
+        aligned = self.defaults.copy()
+        columns = np.fromiter((self.index.get(key, -1) for key in parameter_keys(tags)), dtype=np.intp, count=len(tags))
+        known = columns >= 0
+        aligned[columns[known]] = values[known]
+        unreadable = np.isnan(aligned)
+        aligned[unreadable] = self.defaults[unreadable]
+        return aligned
+
+    def matching(self, pattern):
+        """Returns a boolean column mask of the parameters whose tag matches an fnmatch pattern."""
+        return np.fromiter((fnmatch.fnmatchcase(tag, pattern) for tag in self.tags), dtype=bool, count=len(self.tags))
+
+    def project_record(self, record):
+        """Projects a library PresetRecord, reusing the result on later calls."""
+        aligned = self.projections.get(record)
+        if aligned is None:
+            aligned = self.projections[record] = self.project(record.tags, record.values)
+        return aligned
+
+
+# Fixed format of rendered parameter values; nine significant digits round-trip float32 exactly
+FLOAT_FORMAT = "%.9g"
+
+# Marks slot positions in the serialized template text
+_SLOT_PATTERN = re.compile("\x01(\\d+)\x01")
+
+
+def escape_attribute(text):
+    return escape(text, {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#09;"})
+
+
+class PresetTemplate:
+    """A template preset serialized once into literal text around the values that change.
+
+    Slots are the unmapped/mapped values of the parameters at param_path and, optionally,
+    the preset name (root name and Node_Properties SubPresetName), the Meta UUID and extra
+    Node_Properties attributes, which are added only when given a value if the template
+    lacks them. Rendering a preset is then one join over precomputed text,
+    with parameter values formatted by FLOAT_FORMAT. Slots left unset keep the template's
+    own values.
+    """
+
+    def __init__(self, root, param_path='.//Parameters/*', rename=False, new_uuid=False, node_keys=()):
+        root = copy.deepcopy(root)
+        node_properties = root.find('.//Node_Properties')
+        meta = root.find('.//Meta')
+
+        slots = []
+        self.named_slots = {}
+
+        def add_slot(name, element, key):
+            self.named_slots.setdefault(name, []).append(len(slots))
+            slots.append((element, key))
+
+        if rename:
+            add_slot("name", root, "name")
+            if node_properties is not None:
+                add_slot("name", node_properties, "SubPresetName")
+        if new_uuid and meta is not None:
+            add_slot("uuid", meta, "UUID")
+        # Node_Properties attributes the template lacks are only written when rendered with a value
+        self.optional = {}
+        if node_properties is not None:
+            for key in node_keys:
+                if key not in node_properties.attrib:
+                    self.optional[len(slots)] = key
+                add_slot(key, node_properties, key)
+        self.header = len(slots)
+        params = root.findall(param_path)
+        self.tags = [param.tag for param in params]
+        for param in params:
+            for key in VALUE_KEYS:
+                slots.append((param, key))
+
+        self.defaults = []
+        for i, (element, key) in enumerate(slots):
+            self.defaults.append(escape_attribute(element.get(key, '0')))
+            element.set(key, f"\x01{i}\x01")
+        pieces = _SLOT_PATTERN.split(ET.tostring(root, encoding='unicode', xml_declaration=True))
+        self.literals = pieces[0::2]
+        self.slot_order = [int(slot) for slot in pieces[1::2]]
+
+        # An optional slot spans its whole ' key="value"' text, so leaving it unset adds nothing
+        for position, slot in enumerate(self.slot_order):
+            if slot in self.optional:
+                prefix = f' {self.optional[slot]}="'
+                self.literals[position] = self.literals[position][:-len(prefix)]
+                self.literals[position + 1] = self.literals[position + 1][1:]
+                self.defaults[slot] = ""
+
+    def render(self, values, name=None, uuid=None, node_properties=None):
+        """Renders a (parameters x 2) value array, optionally with a new name, UUID and Node_Properties."""
+        with profiling.timed("render"):
+            fields = self.defaults[:self.header]
+            for slot_name, value in (("name", name), ("uuid", uuid)):
+                if value is not None:
+                    for slot in self.named_slots.get(slot_name, ()):
+                        fields[slot] = escape_attribute(value)
+            for key, value in (node_properties or {}).items():
+                for slot in self.named_slots.get(key, ()):
+                    if slot in self.optional:
+                        fields[slot] = f' {key}="{escape_attribute(value)}"'
+                    else:
+                        fields[slot] = escape_attribute(value)
+
+            flat = values.ravel().tolist()
+            if np.isnan(values).any():
+                # Unreadable input values keep the template's own text
+                print(f"Warning: Couldn't interpolate {int(np.isnan(values).any(axis=-1).sum())} parameters")
+                fields.extend(FLOAT_FORMAT % value if value == value else default
+                              for value, default in zip(flat, self.defaults[self.header:]))
+            else:
+                fields.extend([FLOAT_FORMAT % value for value in flat])
+
+            texts = [fields[slot] for slot in self.slot_order]
+            return "".join(chain.from_iterable(zip(self.literals, texts))) + self.literals[-1]
+
+
+# How discrete parameters (distortion types, modes) pick one preset's value instead of averaging
+DISCRETE_RULES = ("random", "vote", "nearest")
+
+
+def normalize_weights(weights):
+    """Scales each row of blend weights to sum to 1, so blends stay within their inputs' ranges."""
+    weights = np.atleast_2d(np.asarray(weights, dtype=float))
+    totals = weights.sum(axis=1, keepdims=True)
+    if np.any(totals <= 0):
+        raise ValueError("Blend weights must have a positive sum.")
+    return weights / totals
+
+
+def parameter_weights(schema, weights, overrides=None):
+    """Expands (K x presets) blend weights into normalized (K x parameters x presets) weights.
+
+    overrides maps fnmatch patterns on parameter tags to a weight row (or one row per blend)
+    used for the matching parameter group instead; later patterns win. Each parameter's
+    weights are scaled to sum to 1.
+    """
+    weights = np.atleast_2d(np.asarray(weights, dtype=float))
+    shape = (len(weights), len(schema), weights.shape[1])
+    if not overrides:
+        # Every parameter shares its blend's weights, so a read-only view is enough
+        return np.broadcast_to(normalize_weights(weights)[:, None, :], shape)
+
+    expanded = np.empty(shape)
+    expanded[:] = weights[:, None, :]
+    for pattern, group_weights in overrides.items():
+        group_weights = np.atleast_2d(np.asarray(group_weights, dtype=float))
+        if group_weights.shape[-1] != weights.shape[-1]:
+            raise ValueError(f"Expected {weights.shape[-1]} weights for parameters {pattern!r}, got {group_weights.shape[-1]}.")
+        expanded[:, schema.matching(pattern), :] = group_weights[:, None, :]
+    totals = expanded.sum(axis=2, keepdims=True)
+    if np.any(totals <= 0):
+        raise ValueError("Blend weights must have a positive sum for every parameter.")
+    expanded /= totals
+    return expanded
+
+
+def choose_discrete(options, weights, rule="random", rng=None):
+    """Picks which preset supplies each discrete value, for K blends at once.
+
+    options is (K x presets x D) values and weights is (K x presets) or (K x D x presets).
+    "random" draws a preset in proportion to its weight, "vote" takes the value with the
+    most weight behind it and "nearest" the value closest to the weighted mean. Returns
+    the (K x D) winning preset indices.
+    """
+    options = np.asarray(options, dtype=float)
+    count, presets, width = options.shape
+    weights = np.asarray(weights, dtype=float)
+    if weights.ndim == 2:
+        weights = np.broadcast_to(weights[:, None, :], (count, width, presets))
+    weights = weights / weights.sum(axis=2, keepdims=True)
+
+    if rule == "random":
+        rng = rng if rng is not None else np.random.default_rng()
+        cumulative = np.cumsum(weights, axis=2)
+        draws = rng.random((count, width))
+        return np.minimum((cumulative < draws[:, :, None]).sum(axis=2), presets - 1)
+    if rule == "vote":
+        same = options[:, :, None, :] == options[:, None, :, :]
+        scores = np.einsum("kdq,kpqd->kpd", weights, same)
+        return scores.argmax(axis=1)
+    if rule == "nearest":
+        mean = np.einsum("kdp,kpd->kd", weights, options)
+        return np.abs(options - mean[:, None, :]).argmin(axis=1)
+    raise ValueError(f"Unknown discrete rule: {rule}")
+
+
+def blend_groups(schema, values, weights, overrides=None, discrete=(), rule="random", rng=None, jitter=0.0):
+    """Blends one group of presets per row in a single vectorized pass.
+
+    values is (K x presets x parameters x 2), projected onto schema; weights is (K x presets),
+    with per-group overrides as in parameter_weights. jitter > 0 scales every parameter's
+    weights by random log-normal factors of that spread, so each blended value still lies
+    between its group's values. Parameters matching a pattern in `discrete` are not
+    averaged: both values come from the preset chosen by `rule`.
+    Returns the (K x parameters x 2) blends.
+    """
+    with profiling.timed("blend"):
+        expanded = parameter_weights(schema, weights, overrides)
+        if jitter:
+            rng = rng if rng is not None else np.random.default_rng()
+            expanded = expanded * np.exp(jitter * rng.standard_normal(expanded.shape))
+            expanded /= expanded.sum(axis=2, keepdims=True)
+        # One (1 x presets) @ (presets x 2) product per blend and parameter, batched by matmul
+        blended = (expanded[:, :, None, :] @ np.swapaxes(values, 1, 2))[:, :, 0, :]
+        columns = np.zeros(len(schema), dtype=bool)
+        for pattern in discrete:
+            columns |= schema.matching(pattern)
+        if columns.any():
+            columns = np.flatnonzero(columns)
+            winners = choose_discrete(values[:, :, columns, 0], expanded[:, columns, :], rule, rng)
+            blended[:, columns, :] = np.take_along_axis(values[:, :, columns, :], winners[:, None, :, None], axis=1)[:, 0]
+    profiling.count("parameters_blended", blended.shape[0] * blended.shape[1])
+    return blended
+
+
+class LRUCache:
+    """Bounded mapping that drops the least recently used entry first; safe to share between threads.
+
+    Lookups are counted in the hits and misses attributes and as the "<name>_hits" and
+    "<name>_misses" profiling counters. A maxsize of 0 disables the cache.
+    """
+
+    def __init__(self, maxsize, name):
+        self.maxsize = maxsize
+        self.name = name
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Returns the value stored under key, or None."""
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        profiling.count(f"{self.name}_misses" if value is None else f"{self.name}_hits")
+        return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def resize(self, maxsize):
+        with self.lock:
+            self.maxsize = maxsize
+            while len(self.entries) > maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+
+# Parsed input sets and blended rows kept for repeated requests; override with the
+# MUT8_BATCH_CACHE_SIZE and MUT8_BLEND_CACHE_SIZE environment variables, or resize()
+batch_cache = LRUCache(int(os.environ.get("MUT8_BATCH_CACHE_SIZE", 32)), "batch_cache")
+blend_cache = LRUCache(int(os.environ.get("MUT8_BLEND_CACHE_SIZE", 4096)), "blend_cache")
+
+
+def content_key(xml_list):
+    """Identifies a list of preset texts by content, whatever files they were read from."""
+    return tuple(hashlib.blake2b(xml.encode("utf-8"), digest_size=16).digest() for xml in xml_list)
+
+
+def load_batch(xml_list):
+    """Returns the PresetBatch of xml_list, parsing it only if the same presets are not cached."""
+    key = content_key(xml_list)
+    batch = batch_cache.get(key)
+    if batch is None:
+        batch = PresetBatch(xml_list)
+        batch.key = key
+        batch_cache.put(key, batch)
+    return batch
+
+
+def clear_caches():
+    batch_cache.clear()
+    blend_cache.clear()
+
+
+class PresetBatch:
+    """A set of presets parsed once into a (presets x parameters x 2) value matrix.
+
+    Parameters are matched by name against the first preset, which is also the template
+    every blended result is serialized from. Parameters missing from another preset
+    take the template's values.
+    """
+
+    def __init__(self, xml_list):
+        if not xml_list:
+            raise ValueError("At least one preset is required.")
+        self.key = None  # content key, set by load_batch
+        root = ET.fromstring(xml_list[0])
+        self.schema = ParameterSchema.from_params(root.findall('.//Parameters/*'))
+        self.template = PresetTemplate(root, new_uuid=True)
+
+        # Only the template needs a tree; the other inputs are pull-parsed for their values
+        values = [self.schema.defaults]
+        for number, xml in enumerate(xml_list[1:], start=2):
+            _, _, _, tags, preset_values = extract_preset(io.StringIO(xml))
+            missing, extra = self.schema.compare(tags)
+            if missing or extra:
+                print(f"Warning: Preset {number} has {len(missing)} missing and {len(extra)} extra parameters; "
+                      "missing parameters use the template values.")
+            values.append(self.schema.project(tags, preset_values))
+        self.values = np.stack(values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def blend(self, weights, overrides=None, discrete=(), rule="random", rng=None):
+        """Blends the presets with a (K x presets) weight matrix, returning a (K x parameters x 2) array.
+
+        Without overrides or discrete parameters the weights are used as given; otherwise
+        they are normalized per parameter, see blend_groups.
+        """
+        weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        if weights.shape[1] != len(self.values):
+            raise ValueError(f"Expected {len(self.values)} weights per row, got {weights.shape[1]}.")
+        if not overrides and not discrete:
+            with profiling.timed("blend"):
+                blended = np.tensordot(weights, self.values, axes=1)
+            profiling.count("parameters_blended", blended.shape[0] * blended.shape[1])
+            return blended
+        values = np.broadcast_to(self.values, (len(weights),) + self.values.shape)
+        return blend_groups(self.schema, values, weights, overrides, discrete, rule, rng)
+
+    def blend_cached(self, weights, overrides=None, discrete=(), rule="random", rng=None):
+        """Like blend, but rows blended before from the same presets come from blend_cache.
+
+        Only batches from load_batch are cached, and never blends that draw discrete values
+        at random.
+        """
+        if self.key is None or (discrete and rule == "random"):
+            return self.blend(weights, overrides, discrete, rule, rng)
+        weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        # Override patterns keep their order, since later patterns win
+        options = repr((tuple((overrides or {}).items()), tuple(discrete), rule))
+        keys = [(self.key, row.tobytes(), options) for row in weights]
+        rows = [blend_cache.get(key) for key in keys]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        if missing:
+            for i, blended in zip(missing, self.blend(weights[missing], overrides, discrete, rule, rng)):
+                rows[i] = blended.copy()
+                blend_cache.put(keys[i], rows[i])
+        return np.stack(rows)
+
+    def render(self, blended):
+        """Renders one (parameters x 2) blended array through the template, with a fresh UUID."""
+        return self.template.render(blended, uuid=str(uuid4()))
+
+    def write(self, blended, file_path, make_dirs=False):
+        """Writes one blended preset to file_path."""
+        write_atomic(file_path, self.render(blended), make_dirs)
+
+
+def interpolate_presets_batch(xml_list, weight_matrix):
+    """Interpolates presets once per row of weight_matrix, reusing cached inputs and blends."""
+    batch = load_batch(xml_list)
+    return [batch.render(blended) for blended in batch.blend_cached(weight_matrix)]
+
+
+def interpolate_presets(xml_list, weights):
+    """Interpolates multiple presets based on weights."""
+    return interpolate_presets_batch(xml_list, [weights])[0]
+
+
+# Easing curves for sweeps, mapping progress in [0, 1] onto [0, 1]
+EASINGS = {
+    "linear": lambda t: t,
+    "ease_in": lambda t: t * t,
+    "ease_out": lambda t: t * (2.0 - t),
+    "smoothstep": lambda t: t * t * (3.0 - 2.0 * t),
+}
+
+
+def iter_sweep_weights(count, steps, easing="linear"):
+    """Yields one weight row per step of a morph that travels through `count` presets in order.
+
+    easing is a name from EASINGS or a callable on progress in [0, 1].
+    """
+    if count < 2:
+        raise ValueError("A sweep needs at least two presets.")
+    curve = EASINGS[easing] if isinstance(easing, str) else easing
+    for step in range(steps):
+        position = curve(step / (steps - 1) if steps > 1 else 0.0) * (count - 1)
+        lower = min(max(int(position), 0), count - 2)
+        fraction = position - lower
+        weights = np.zeros(count)
+        weights[lower] = 1.0 - fraction
+        weights[lower + 1] = fraction
+        yield weights
+
+
+def sweep_weights(count, steps, easing="linear"):
+    """Weight rows of a sweep as one (steps x count) matrix."""
+    return np.array(list(iter_sweep_weights(count, steps, easing))).reshape(steps, count)
+
+
+def iter_sweep(xml_list, steps, easing="linear"):
+    """Yields the serialized preset of every sweep step, parsing the inputs only once."""
+    batch = load_batch(xml_list)
+    for weights in iter_sweep_weights(len(batch), steps, easing):
+        yield batch.render(batch.blend_cached(weights)[0])
+
+
+def sweep_output_path(output, step):
+    """Output path of one sweep step; outputs without a {step} field are treated as directories."""
+    if "{step" in output:
+        return output.format(step=step)
+    return os.path.join(output, f"morph_{step:03d}.xml")
+
+
+def write_sweep(xml_list, steps, output, easing="linear"):
+    """Streams every sweep step straight to disk, one step in memory at a time.
+
+    Returns the written paths.
+    """
+    batch = load_batch(xml_list)
+    written = []
+    for step, weights in enumerate(iter_sweep_weights(len(batch), steps, easing)):
+        file_path = sweep_output_path(output, step)
+        batch.write(batch.blend_cached(weights)[0], file_path, make_dirs=True)
+        written.append(file_path)
+    return written
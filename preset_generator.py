@@ -1,142 +1,80 @@
 import os
-import xml.etree.ElementTree as ET
 import random
+import queue
+import time
+import numpy as np
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox
+from effects_generator import EXPLORE_CANDIDATES, category_template, condition_index, generate_variants, plan_blends
+from preset_core import DISCRETE_RULES
+from preset_index import PAIRINGS
+from preset_library import LibraryWatcher, generate_output_directories, library_roots
+from preset_writer import release_placeholders, reserve_path, write_atomic
 
-BASE_DIR = "/Library/Application Support/Minimal/Current/SubPresets/"
-EXCLUDED_CATEGORIES = ["Effect Rack", "Curve Shapes", "Chord Bank", "Rift Distortion", "Morph EQ"]
-
-def load_categories_and_conditions(base_dir):
-    categories = {}
-    for category_name in os.listdir(base_dir):
-        if category_name in EXCLUDED_CATEGORIES:
-            continue  # Skip excluded categories
-        category_path = os.path.join(base_dir, category_name)
-        if os.path.isdir(category_path):
-            conditions = [
-                folder for folder in os.listdir(category_path)
-                if os.path.isdir(os.path.join(category_path, folder)) and folder != "User"
-            ]
-            categories[category_name] = conditions
-    return categories
-
-def generate_output_directories(base_dir, categories):
-    output_dirs = {}
-    for category in categories:
-        output_dirs[category] = os.path.join(base_dir, category, "User/")
-    return output_dirs
-
-def load_factory_effects(base_dir, categories_and_conditions):
-    factory_effects = {}
-    for category, conditions in categories_and_conditions.items():
-        factory_effects[category] = {}
-        for condition in conditions:
-            condition_path = os.path.join(base_dir, category, condition)
-            factory_effects[category][condition] = []
-            for file in os.listdir(condition_path):
-                if file.endswith(".xml"):
-                    file_path = os.path.join(condition_path, file)
-                    try:
-                        tree = ET.parse(file_path)
-                        root_element = tree.getroot()
-                        preset_name = root_element.get("name", os.path.basename(file).replace(".xml", ""))
-                        factory_effects[category][condition].append({"name": preset_name, "path": file_path, "xml": root_element})
-                    except Exception as e:
-                        print(f"Error loading {file_path}: {e}")
-    return factory_effects
-
-def interpolate_parameters(default_params, preset1_params, preset2_params):
-    blended_params = []
-    for default_param in default_params:
-        name = default_param.tag
-        unmapped1 = float(preset1_params.find(name).get("unmapped_value", 0))
-        unmapped2 = float(preset2_params.find(name).get("unmapped_value", 0))
-        mapped1 = float(preset1_params.find(name).get("mapped_value", 0))
-        mapped2 = float(preset2_params.find(name).get("mapped_value", 0))
-
-        blended_unmapped = (unmapped1 + unmapped2) / 2
-        blended_mapped = (mapped1 + mapped2) / 2
-
-        default_param.set("unmapped_value", str(blended_unmapped))
-        default_param.set("mapped_value", str(blended_mapped))
-        blended_params.append(default_param)
-    return blended_params
-
-def interpolate_distortion_types(node_properties, preset1_node_properties, preset2_node_properties):
-    """Interpolates PositiveDistType and NegativeDistType."""
-    positive1 = int(preset1_node_properties.get("PositiveDistType", 0))
-    positive2 = int(preset2_node_properties.get("PositiveDistType", 0))
-    negative1 = int(preset1_node_properties.get("NegativeDistType", 0))
-    negative2 = int(preset2_node_properties.get("NegativeDistType", 0))
-
-    interpolated_positive = random.choice([positive1, positive2])
-    interpolated_negative = random.choice([negative1, negative2])
-
-    node_properties.set("PositiveDistType", str(interpolated_positive))
-    node_properties.set("NegativeDistType", str(interpolated_negative))
-
-def generate_interpolated_preset_with_defaults(factory_effects, category, condition, target_directory):
-    if category not in factory_effects or condition not in factory_effects[category] or len(factory_effects[category][condition]) < 2:
+# SubPresets folders to blend from, set with MUT8_LIBRARY_ROOTS
+BASE_DIR = library_roots()
+
+# How often the library folders are checked for added, changed or removed presets
+WATCH_INTERVAL_MS = 2000
+
+def generate_interpolated_preset_with_defaults(factory_effects, category, condition, target_directory, pairing="random", watcher=None, seed=None, **options):
+    size = options.get("size", 2)
+    if category not in factory_effects or condition not in factory_effects[category] or len(factory_effects[category][condition]) < size:
         messagebox.showerror("Error", f"Not enough presets in category: {category}, condition: {condition}")
         return
 
-    preset1 = random.choice(factory_effects[category][condition])["xml"]
-    preset2 = random.choice(factory_effects[category][condition])["xml"]
-
     default_path = os.path.join(target_directory, "DEFAULT.xml")
     if not os.path.exists(default_path):
         messagebox.showerror("Error", f"Default preset not found: {default_path}")
         return
 
-    default_tree = ET.parse(default_path)
-    default_root = default_tree.getroot()
+    schema, template = category_template(category, default_path)
+
+    # Pick different presets whose blend is not a near-copy of an existing one
+    presets = factory_effects[category][condition]
+    index = condition_index(category, condition, schema, presets)
+    # Report the seed so a good result can be generated again
+    if seed is None:
+        seed = random.getrandbits(32)
+    rng = np.random.default_rng(seed)
+    groups, blended, node_overrides = plan_blends(category, index, 1, rng, pairing, **options)
+    if not len(groups):
+        messagebox.showerror("Error", f"Could not find a blend that differs from the existing presets in {condition}.")
+        return
+    blended, overrides = blended[0], node_overrides[0]
 
     # Generate file name and encode it into SubPresetName
     base_name = f"blended_{category}_{condition}"
-    counter = 1
-    existing_files = os.listdir(target_directory)
-    while f"{base_name}_{counter}.xml" in existing_files:
-        counter += 1
-    output_filename = f"{base_name}_{counter}.xml"
+    os.makedirs(target_directory, exist_ok=True)
+    # The watcher's counter is only a starting hint; reserve_path claims the file itself
+    start = watcher.reserve_counter(category, base_name) if watcher is not None else 1
+    output_path, counter = reserve_path(target_directory, base_name, start)
     sub_preset_name = f"{base_name}_{counter}"
 
-    # Update SubPresetName
-    default_root.set("name", sub_preset_name)
-    node_properties = default_root.find(".//Node_Properties")
-    if node_properties is not None:
-        node_properties.set("SubPresetName", sub_preset_name)
-
-        # Special handling for Polar Distortion
-        if category == "Polar Distortion":
-            preset1_node_properties = preset1.find(".//Node_Properties")
-            preset2_node_properties = preset2.find(".//Node_Properties")
-            if preset1_node_properties is not None and preset2_node_properties is not None:
-                interpolate_distortion_types(node_properties, preset1_node_properties, preset2_node_properties)
-
-    # Interpolate parameters
-    default_params = default_root.find("Parameters")
-    preset1_params = preset1.find("Parameters")
-    preset2_params = preset2.find("Parameters")
-
-    blended_params = interpolate_parameters(default_params, preset1_params, preset2_params)
-    default_params.clear()
-    default_params.extend(blended_params)
-
     # Write the output file
-    os.makedirs(target_directory, exist_ok=True)
-    output_path = os.path.join(target_directory, output_filename)
-    default_tree.write(output_path, encoding="unicode", xml_declaration=True)
-    messagebox.showinfo("Success", f"Preset saved to: {output_path}")
+    try:
+        write_atomic(output_path, template.render(blended, name=sub_preset_name, node_properties=overrides))
+    except Exception as e:
+        release_placeholders([output_path])
+        messagebox.showerror("Error", f"Failed to write preset: {e}")
+        return
+    messagebox.showinfo("Success", f"Preset saved to: {output_path}\nSeed: {seed}")
 
 class PresetGeneratorApp(tk.Frame):
     def __init__(self, master):
         super().__init__(master)
 
-        # Load data
-        self.categories_and_conditions = load_categories_and_conditions(BASE_DIR)
-        self.output_directories = generate_output_directories(BASE_DIR, self.categories_and_conditions)
-        self.factory_effects = load_factory_effects(BASE_DIR, self.categories_and_conditions)
+        # The library is scanned by the first watcher poll on the loader thread, so the tab
+        # shows at once; a condition's presets are parsed the first time it is selected
+        self.categories_and_conditions = {}
+        self.output_directories = {}
+        self.factory_effects = {}
+        self.watcher = LibraryWatcher(BASE_DIR)
+        self.watch_future = None
+        self.loader = ThreadPoolExecutor(max_workers=1)
+        self.pending_loads = {}
+        self.pending_generate = None
 
         # UI setup
         tk.Label(self, text="Category").grid(row=0, column=0, padx=10, pady=10)
@@ -149,23 +87,225 @@ class PresetGeneratorApp(tk.Frame):
         tk.Label(self, text="Condition").grid(row=1, column=0, padx=10, pady=10)
         self.condition_var = tk.StringVar()
         self.condition_dropdown = ttk.Combobox(self, textvariable=self.condition_var)
+        self.condition_dropdown.bind("<<ComboboxSelected>>", self.load_selected_condition)
         self.condition_dropdown.grid(row=1, column=1, padx=10, pady=10)
 
-        tk.Button(self, text="Generate Preset", command=self.generate_preset).grid(row=3, column=0, columnspan=2, pady=20)
+        tk.Label(self, text="Pairing").grid(row=2, column=0, padx=10, pady=10)
+        self.pairing_var = tk.StringVar(value=PAIRINGS[0])
+        ttk.Combobox(self, textvariable=self.pairing_var, values=PAIRINGS, state="readonly").grid(row=2, column=1, padx=10, pady=10)
+
+        tk.Label(self, text="Presets per blend").grid(row=3, column=0, padx=10, pady=5)
+        self.blend_size_var = tk.IntVar(value=2)
+        tk.Spinbox(self, from_=2, to=16, textvariable=self.blend_size_var, width=8).grid(row=3, column=1, padx=10, pady=5)
+        tk.Label(self, text="Distortion types").grid(row=4, column=0, padx=10, pady=5)
+        self.rule_var = tk.StringVar(value=DISCRETE_RULES[0])
+        ttk.Combobox(self, textvariable=self.rule_var, values=DISCRETE_RULES, state="readonly").grid(row=4, column=1, padx=10, pady=5)
+
+        tk.Label(self, text="Seed").grid(row=5, column=0, padx=10, pady=5)
+        self.seed_var = tk.StringVar()
+        tk.Entry(self, textvariable=self.seed_var, width=12).grid(row=5, column=1, padx=10, pady=5)
+        self.explore_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self, text=f"Explore (best of {EXPLORE_CANDIDATES} random blends)", variable=self.explore_var).grid(row=6, column=0, columnspan=2)
+
+        self.status_var = tk.StringVar()
+        tk.Label(self, textvariable=self.status_var).grid(row=7, column=0, columnspan=2)
+
+        tk.Button(self, text="Generate Preset", command=self.generate_preset).grid(row=8, column=0, columnspan=2, pady=20)
+
+        # Batch generation
+        tk.Label(self, text="Variants").grid(row=9, column=0, padx=10, pady=5)
+        self.variant_count_var = tk.IntVar(value=10)
+        tk.Spinbox(self, from_=1, to=10000, textvariable=self.variant_count_var, width=8).grid(row=9, column=1, padx=10, pady=5)
+        self.all_conditions_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self, text="All conditions", variable=self.all_conditions_var).grid(row=10, column=0)
+        self.archive_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self, text="Zip archive", variable=self.archive_var).grid(row=10, column=1)
+        self.batch_button = tk.Button(self, text="Generate Batch", command=self.generate_batch)
+        self.batch_button.grid(row=11, column=0, columnspan=2, pady=10)
+        self.batch_runner = ThreadPoolExecutor(max_workers=1)
+        self.batch_future = None
+        self.batch_progress = queue.Queue()
+        self.status_var.set("Scanning library...")
+        self.watch_library()
+
+    def blend_options(self):
+        """Returns the blend size, discrete rule, seed and exploring chosen in the UI, or None if invalid.
+
+        An empty seed means a random one.
+        """
+        try:
+            size = int(self.blend_size_var.get())
+        except (tk.TclError, ValueError):
+            size = 0
+        if size < 2:
+            messagebox.showerror("Error", "Please enter at least 2 presets per blend.")
+            return None
+        seed = self.seed_var.get().strip()
+        if seed and not seed.isdigit():
+            messagebox.showerror("Error", "Please enter a whole number as the seed, or leave it empty.")
+            return None
+        return {
+            "size": size, "rule": self.rule_var.get(), "seed": int(seed) if seed else None,
+            "explore": EXPLORE_CANDIDATES if self.explore_var.get() else 0,
+        }
 
     def update_conditions(self, event):
         category = self.category_var.get()
         if category in self.categories_and_conditions:
             self.condition_dropdown["values"] = self.categories_and_conditions[category]
 
+    def load_selected_condition(self, event=None):
+        self.request_condition(self.category_var.get(), self.condition_var.get())
+
+    def request_condition(self, category, condition):
+        """Starts loading a condition's presets in the background unless already loaded."""
+        key = (category, condition)
+        if condition in self.factory_effects.get(category, {}) or key in self.pending_loads:
+            return
+        self.pending_loads[key] = self.loader.submit(self.load_condition_presets, category, condition)
+        self.status_var.set(f"Loading {category} / {condition}...")
+        if len(self.pending_loads) == 1:
+            self.after(50, self.poll_loads)
+
+    def load_condition_presets(self, category, condition):
+        # Runs on the loader thread, so it must not touch any widgets
+        return self.watcher.load(category, condition)
+
+    def watch_library(self):
+        """Polls the library on the loader thread and applies the changes on the Tk thread."""
+        if self.watch_future is None:
+            self.watch_future = self.loader.submit(self.watcher.poll)
+        elif self.watch_future.done():
+            future, self.watch_future = self.watch_future, None
+            try:
+                self.apply_library_changes(*future.result())
+            except Exception as e:
+                print(f"Warning: Failed to refresh the preset library: {e}")
+            self.after(WATCH_INTERVAL_MS, self.watch_library)
+            return
+        self.after(100, self.watch_library)
+
+    def apply_library_changes(self, categories, changed):
+        if categories is not None:
+            if not self.categories_and_conditions:
+                self.status_var.set(f"{len(categories)} categories found")
+            self.categories_and_conditions = categories
+            self.output_directories = generate_output_directories(BASE_DIR, categories)
+            self.category_dropdown["values"] = list(categories.keys())
+            self.update_conditions(None)
+            for category in list(self.factory_effects):
+                loaded = self.factory_effects[category]
+                for condition in list(loaded):
+                    if condition not in categories.get(category, ()):
+                        del loaded[condition]
+        for (category, condition), presets in changed.items():
+            if condition in self.factory_effects.get(category, {}):
+                self.factory_effects[category][condition] = presets
+        if changed:
+            count = sum(len(presets) for presets in changed.values())
+            self.status_var.set(f"Library updated: {count} presets in {len(changed)} changed conditions")
+
+    def poll_loads(self):
+        """Collects finished background loads on the Tk thread."""
+        for key, future in list(self.pending_loads.items()):
+            if not future.done():
+                continue
+            del self.pending_loads[key]
+            category, condition = key
+            try:
+                presets = future.result()
+            except Exception as e:
+                self.status_var.set(f"Failed to load {category} / {condition}: {e}")
+                if self.pending_generate == key:
+                    self.pending_generate = None
+                continue
+            self.factory_effects.setdefault(category, {})[condition] = presets
+            self.status_var.set(f"{len(presets)} presets loaded from {category} / {condition}")
+            if self.pending_generate == key:
+                self.pending_generate = None
+                self.generate_preset()
+        if self.pending_loads:
+            self.after(50, self.poll_loads)
+
     def generate_preset(self):
         category = self.category_var.get()
         condition = self.condition_var.get()
         if not category or not condition:
             messagebox.showerror("Error", "Please select a category and condition.")
             return
+        if condition not in self.factory_effects.get(category, {}):
+            # Generate as soon as the background load finishes
+            self.pending_generate = (category, condition)
+            self.request_condition(category, condition)
+            return
+        options = self.blend_options()
+        if options is None:
+            return
         target_directory = self.output_directories.get(category, "./output/")
-        generate_interpolated_preset_with_defaults(self.factory_effects, category, condition, target_directory)
+        generate_interpolated_preset_with_defaults(
+            self.factory_effects, category, condition, target_directory, self.pairing_var.get(), self.watcher, **options
+        )
+
+    def generate_batch(self):
+        """Generates many variants for the selected condition, or all of the category's conditions."""
+        category = self.category_var.get()
+        condition = self.condition_var.get()
+        if not category or (not condition and not self.all_conditions_var.get()):
+            messagebox.showerror("Error", "Please select a category and condition.")
+            return
+        try:
+            count = int(self.variant_count_var.get())
+        except (tk.TclError, ValueError):
+            messagebox.showerror("Error", "Please enter a valid number of variants.")
+            return
+        options = self.blend_options()
+        if options is None:
+            return
+        if self.all_conditions_var.get():
+            jobs = [(category, name) for name in self.categories_and_conditions.get(category, [])]
+        else:
+            jobs = [(category, condition)]
+
+        archive = None
+        if self.archive_var.get():
+            archive = os.path.join(self.output_directories[category], f"blended_{category}_{time.strftime('%Y%m%d-%H%M%S')}.zip")
+
+        self.batch_button.config(state=tk.DISABLED)
+        self.status_var.set(f"Generating {count * len(jobs)} presets...")
+        self.batch_future = self.batch_runner.submit(
+            generate_variants, BASE_DIR, jobs, count,
+            progress=lambda done, total: self.batch_progress.put((done, total)),
+            pairing=self.pairing_var.get(), archive=archive, **options,
+        )
+        self.after(100, self.poll_batch)
+
+    def poll_batch(self):
+        """Shows batch progress and the final summary on the Tk thread."""
+        progress = None
+        while not self.batch_progress.empty():
+            progress = self.batch_progress.get_nowait()
+        if progress is not None:
+            self.status_var.set(f"Written {progress[0]} / {progress[1]} presets...")
+        if not self.batch_future.done():
+            self.after(100, self.poll_batch)
+            return
+
+        self.batch_button.config(state=tk.NORMAL)
+        try:
+            summary = self.batch_future.result()
+        except Exception as e:
+            self.status_var.set("")
+            messagebox.showerror("Error", f"Batch generation failed: {e}")
+            return
+        message = f"Wrote {len(summary['written'])} presets in {summary['elapsed']:.1f}s."
+        if summary["archive"]:
+            message += f" Archive: {summary['archive']}"
+        if summary["skipped"]:
+            message += f" Skipped {summary['skipped']} near-duplicates."
+        self.status_var.set(message)
+        if summary["errors"]:
+            message += "\n\n" + "\n".join(summary["errors"][:10])
+        messagebox.showinfo("Batch Complete", message)
 
 if __name__ == "__main__":
     root = tk.Tk()
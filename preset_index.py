@@ -0,0 +1,155 @@
+import numpy as np
+
+# RMS difference of unmapped values below which two presets count as duplicates
+DUPLICATE_DISTANCE = 0.005
+
+# Query rows per distance matrix product, bounding temporary memory
+QUERY_CHUNK = 1024
+
+# How blend partners are chosen: any other preset, a near neighbour, or a far one
+PAIRINGS = ("random", "similar", "different")
+
+
+class PresetIndex:
+    """Nearest-neighbour index over the unmapped parameter values of a set of presets.
+
+    Presets are projected onto a ParameterSchema, so vectors align by parameter name.
+    Distances are root-mean-square differences of the unmapped (0-1 normalized) values,
+    computed as chunked matrix products so tens of thousands of presets stay fast.
+    """
+
+    def __init__(self, schema, records):
+        self.schema = schema
+        self.records = list(records)
+        self.vectors = self.vectorize([schema.project_record(record) for record in self.records])
+        self.norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+
+    def __len__(self):
+        return len(self.records)
+
+    def vectorize(self, values):
+        """Converts (parameters x 2) value arrays, or a stack of them, into index vectors."""
+        size = len(self.schema)
+        if len(values) == 0:
+            return np.zeros((0, size), dtype=np.float32)
+        values = np.asarray(values, dtype=float).reshape(-1, size, 2)
+        return (values[:, :, 0] / np.sqrt(max(size, 1))).astype(np.float32)
+
+    def squared_distances(self, vectors):
+        """Yields (start, squared distance matrix) for chunks of query vectors against the index."""
+        vectors = np.atleast_2d(vectors).astype(np.float32)
+        for start in range(0, len(vectors), QUERY_CHUNK):
+            chunk = vectors[start:start + QUERY_CHUNK]
+            squared = np.einsum("ij,ij->i", chunk, chunk)[:, None] - 2.0 * (chunk @ self.vectors.T) + self.norms[None, :]
+            yield start, np.maximum(squared, 0.0)
+
+    def query(self, vectors, k=5, exclude=None, farthest=False):
+        """Returns (indices, distances) of the k nearest (or farthest) presets for each query vector.
+
+        exclude optionally gives one index per query row to leave out, usually the query itself.
+        """
+        vectors = np.atleast_2d(vectors)
+        k = min(k, len(self) - (exclude is not None))
+        indices = np.zeros((len(vectors), max(k, 0)), dtype=np.intp)
+        distances = np.zeros((len(vectors), max(k, 0)))
+        if k <= 0:
+            return indices, distances
+
+        for start, squared in self.squared_distances(vectors):
+            rows = np.arange(len(squared))
+            if exclude is not None:
+                squared[rows, np.asarray(exclude)[start:start + len(squared)]] = -np.inf if farthest else np.inf
+            keys = -squared if farthest else squared
+            part = np.argpartition(keys, k - 1, axis=1)[:, :k]
+            order = np.argsort(np.take_along_axis(keys, part, axis=1), axis=1)
+            chosen = np.take_along_axis(part, order, axis=1)
+            indices[start:start + len(squared)] = chosen
+            distances[start:start + len(squared)] = np.sqrt(np.take_along_axis(squared, chosen, axis=1))
+        return indices, distances
+
+    def nearest(self, values, k=5):
+        """Returns [(record, distance)] of the k presets closest to a (parameters x 2) value array."""
+        indices, distances = self.query(self.vectorize([values]), k)
+        return [(self.records[i], d) for i, d in zip(indices[0], distances[0])]
+
+    def neighbours(self, index, k=5):
+        """Returns [(record, distance)] of the k presets closest to indexed preset `index`."""
+        indices, distances = self.query(self.vectors[index], k, exclude=[index])
+        return [(self.records[i], d) for i, d in zip(indices[0], distances[0])]
+
+    def farthest_pair(self, rounds=4, rng=None):
+        """Approximates the most different pair of presets by repeated farthest-point hops."""
+        if len(self) < 2:
+            raise ValueError("At least two presets are required.")
+        rng = rng if rng is not None else np.random.default_rng()
+        first = int(rng.integers(len(self)))
+        second = first
+        for _ in range(rounds):
+            indices, _ = self.query(self.vectors[first], 1, exclude=[first], farthest=True)
+            first, second = int(indices[0, 0]), first
+        return second, first
+
+    def pick_pairs(self, count, rng, pairing="random", k=8):
+        """Picks `count` pairs of distinct preset indices as a (count x 2) array.
+
+        pairing is "random" (any other preset), "similar" (one of the k nearest neighbours
+        of a random preset) or "different" (one of its k farthest presets).
+        """
+        return self.pick_groups(count, 2, rng, pairing, k)
+
+    def pick_groups(self, count, size, rng, pairing="random", k=8):
+        """Picks `count` groups of `size` distinct preset indices as a (count x size) array.
+
+        Each group starts from a random preset; the others are drawn from all other presets,
+        or from its max(k, size - 1) nearest or farthest presets (see pick_pairs).
+        """
+        total = len(self)
+        if size < 2 or total < size:
+            raise ValueError(f"At least {max(size, 2)} presets are required.")
+        first = rng.integers(total, size=count)
+        if pairing == "random":
+            others = rng.integers(total - 1, size=(count, size - 1))
+            others += others >= first[:, None]
+            ordered = np.sort(others, axis=1)
+            repeated = np.flatnonzero((ordered[:, 1:] == ordered[:, :-1]).any(axis=1))
+            if len(repeated):
+                # Redraw groups that drew a preset twice: random keys with the anchor forced last
+                keys = rng.random((len(repeated), total))
+                keys[np.arange(len(repeated)), first[repeated]] = 2.0
+                others[repeated] = np.argpartition(keys, size - 2, axis=1)[:, :size - 1]
+        elif pairing in ("similar", "different"):
+            candidates, _ = self.query(self.vectors[first], max(k, size - 1), exclude=first, farthest=pairing == "different")
+            picks = np.argsort(rng.random(candidates.shape), axis=1)[:, :size - 1]
+            others = np.take_along_axis(candidates, picks, axis=1)
+        else:
+            raise ValueError(f"Unknown pairing: {pairing}")
+        return np.concatenate([first[:, None], others], axis=1)
+
+    def duplicates(self, vectors, threshold=DUPLICATE_DISTANCE):
+        """Flags vectors within threshold of an indexed preset or of an earlier vector in the list."""
+        vectors = np.atleast_2d(vectors).astype(np.float32)
+        flags = np.zeros(len(vectors), dtype=bool)
+        limit = threshold * threshold
+        if len(self):
+            for start, squared in self.squared_distances(vectors):
+                flags[start:start + len(squared)] = squared.min(axis=1) < limit
+
+        # Greedy pass among the new vectors themselves, a chunk at a time
+        accepted = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        for start in range(0, len(vectors), QUERY_CHUNK):
+            chunk = vectors[start:start + QUERY_CHUNK]
+            chunk_flags = flags[start:start + len(chunk)]
+            if len(accepted):
+                chunk_flags |= squared_distance_matrix(chunk, accepted).min(axis=1) < limit
+            inner = squared_distance_matrix(chunk, chunk) < limit
+            for i in range(len(chunk)):
+                if not chunk_flags[i]:
+                    chunk_flags[i + 1:] |= inner[i, i + 1:]
+            accepted = np.concatenate([accepted, chunk[~chunk_flags]])
+        return flags
+
+
+def squared_distance_matrix(a, b):
+    """Squared Euclidean distances between the rows of a and b."""
+    squared = np.einsum("ij,ij->i", a, a)[:, None] - 2.0 * (a @ b.T) + np.einsum("ij,ij->i", b, b)[None, :]
+    return np.maximum(squared, 0.0)
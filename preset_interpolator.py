@@ -1,57 +1,29 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import xml.etree.ElementTree as ET
-from uuid import uuid4
+from live_preview import LivePreview
+from preset_core import load_batch
+from preset_writer import write_atomic
 
 APP_NAME = "Preset Interpolator"
 VERSION = "1.0.4"
 
-def interpolate_presets(xml_list, weights):
-    """Interpolates multiple presets based on weights."""
-    roots = [ET.fromstring(xml) for xml in xml_list]
-    new_root = ET.fromstring(xml_list[0])
-
-    # Update UUID
-    meta = new_root.find('.//Meta')
-    if meta is not None:
-        meta.set('UUID', str(uuid4()))
-
-    # Interpolate Parameters
-    params_list = [root.findall('.//Parameters/*') for root in roots]
-    new_params = new_root.findall('.//Parameters/*')
-
-    for param_set in zip(*params_list, new_params):
-        try:
-            values = {"unmapped_value": [], "mapped_value": []}
-            for i, param in enumerate(param_set[:-1]):
-                for key in values.keys():
-                    value = float(param.get(key, '0')) * weights[i]
-                    values[key].append(value)
-
-            for key in values.keys():
-                interpolated_value = sum(values[key])
-                param_set[-1].set(key, f"{interpolated_value}")
-        except Exception as e:
-            print(f"Warning: Couldn't interpolate parameter {param_set[0].tag}: {e}")
-            continue
-
-    return ET.tostring(new_root, encoding='unicode', xml_declaration=True)
-
 class PresetInterpolatorApp(tk.Frame):
-    def __init__(self, master):
+    def __init__(self, master, generate_text="Generate Preset"):
         super().__init__(master)
         self.master = master
         self.presets = []
         self.weight_sliders = []
+        self.preview = LivePreview(self, self.current_weights)
 
         for i in range(4):
             tk.Button(self, text=f"Load Preset {i + 1}", command=lambda i=i: self.load_preset(i)).grid(row=i, column=0, padx=5, pady=5)
-            slider = tk.Scale(self, from_=0.0, to=1.0, resolution=0.01, orient=tk.HORIZONTAL, label=f"Weight {i + 1}")
+            slider = tk.Scale(self, from_=0.0, to=1.0, resolution=0.01, orient=tk.HORIZONTAL, label=f"Weight {i + 1}", command=self.preview.schedule)
             slider.grid(row=i, column=1, padx=5, pady=5)
             self.weight_sliders.append(slider)
 
         tk.Button(self, text="Normalize Weights", command=self.normalize_weights).grid(row=4, column=1, padx=10, pady=10)
-        tk.Button(self, text="Generate Preset", command=self.generate_preset).grid(row=5, column=0, pady=10)
+        tk.Button(self, text=generate_text, command=self.generate_preset).grid(row=5, column=0, pady=10)
+        self.preview.grid(row=6, column=0, columnspan=2, padx=5, pady=5, sticky="nsew")
 
     def load_preset(self, index):
         file_path = filedialog.askopenfilename(filetypes=[("XML files", "*.xml")])
@@ -62,9 +34,14 @@ class PresetInterpolatorApp(tk.Frame):
                     self.presets[index] = xml
                 else:
                     self.presets.append(xml)
+            self.preview.set_presets(self.presets)
             messagebox.showinfo("Loaded", f"Loaded Preset {index + 1}.")
 
+    def current_weights(self, count):
+        return [slider.get() for slider in self.weight_sliders[:count]]
+
     def normalize_weights(self):
+        """Normalize weights to ensure they sum to 1."""
         total = sum(slider.get() for slider in self.weight_sliders if slider.get() > 0)
         if total > 0:
             for slider in self.weight_sliders:
@@ -78,11 +55,12 @@ class PresetInterpolatorApp(tk.Frame):
         try:
             weights = [slider.get() for slider in self.weight_sliders[:len(self.presets)]]
             self.normalize_weights()
-            new_preset = interpolate_presets(self.presets, weights)
+            # Reuse the preview's parsed presets when they are ready
+            batch = self.preview.batch if self.preview.batch is not None else load_batch(self.presets)
+            new_preset = batch.render(batch.blend_cached(weights)[0])
             file_path = filedialog.asksaveasfilename(defaultextension=".xml", filetypes=[("XML files", "*.xml")])
             if file_path:
-                with open(file_path, 'w') as f:
-                    f.write(new_preset)
+                write_atomic(file_path, new_preset)
                 messagebox.showinfo("Success", f"Preset saved to {file_path}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to generate preset: {e}")
@@ -0,0 +1,375 @@
+import os
+import pickle
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import profiling
+from preset_core import extract_preset
+from preset_writer import temporary_path
+
+EXCLUDED_CATEGORIES = ["Effect Rack", "Curve Shapes", "Chord Bank", "Rift Distortion", "Morph EQ"]
+
+# Parsed presets are cached here between runs; override with the MUT8_CACHE environment variable
+CACHE_PATH = os.environ.get(
+    "MUT8_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "mut8current", "presets.pickle")
+)
+CACHE_VERSION = 5
+
+# Library roots searched in order; override with MUT8_LIBRARY_ROOTS, separated by os.pathsep
+DEFAULT_LIBRARY_ROOT = "/Library/Application Support/Minimal/Current/SubPresets/"
+LIBRARY_ROOTS = [root for root in os.environ.get("MUT8_LIBRARY_ROOTS", DEFAULT_LIBRARY_ROOT).split(os.pathsep) if root]
+
+# Roots already reported missing, so polling does not repeat the warning
+missing_roots = set()
+
+# Threads scanning roots and condition folders at once, so network storage latency overlaps
+SCAN_WORKERS = 8
+
+# Output file names are "<base name>_<counter>.xml"
+COUNTER_PATTERN = re.compile(r"^(.*)_(\d+)\.xml$")
+
+
+class PresetRecord:
+    """Compact parsed form of a preset file: name, Node_Properties and parameter values."""
+
+    __slots__ = ("name", "path", "uuid", "tags", "values", "node_properties")
+
+    def __init__(self, name, path, uuid, tags, values, node_properties):
+        self.name = name
+        self.path = path
+        self.uuid = uuid                        # Meta UUID, or None
+        self.tags = tags                        # interned parameter tags, in file order
+        self.values = values                    # (parameters x 2) unmapped/mapped array
+        self.node_properties = node_properties  # Node_Properties attributes, or None
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+        # Share tag strings between records again after unpickling
+        self.tags = tuple(sys.intern(tag) for tag in self.tags)
+
+
+def parse_preset(file_path):
+    """Extracts a PresetRecord from a preset file without building its element tree."""
+    name, uuid, node_properties, tags, values = extract_preset(file_path, root_parameters_only=True)
+    if name is None:
+        name = os.path.basename(file_path).replace(".xml", "")
+    return PresetRecord(name, file_path, uuid, tags, values, node_properties)
+
+
+class PresetCache:
+    """On-disk cache of parsed presets, keyed by path and invalidated by mtime and size."""
+
+    def __init__(self, cache_path=CACHE_PATH):
+        self.cache_path = cache_path
+        self.entries = {}
+        self.dirty = False
+        try:
+            with open(cache_path, "rb") as f:
+                # The version is pickled on its own so stale record layouts are never unpickled
+                if pickle.load(f) == CACHE_VERSION:
+                    self.entries = pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Ignoring unreadable preset cache {cache_path}: {e}")
+
+    def get(self, file_path):
+        """Returns the record for file_path, re-parsing only if the file changed."""
+        stat = os.stat(file_path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        entry = self.entries.get(file_path)
+        if entry is not None and entry[0] == key:
+            profiling.count("cache_hits")
+            return entry[1]
+        profiling.count("cache_misses")
+        record = parse_preset(file_path)
+        self.entries[file_path] = (key, record)
+        self.dirty = True
+        return record
+
+    def save(self):
+        """Writes the cache back to disk if anything changed, dropping deleted files."""
+        if not self.dirty:
+            return
+        # A snapshot, as other threads may add entries while it is written; the unique temporary
+        # name lets several threads or processes (the app, CLI runs) save at the same time
+        entries = {path: entry for path, entry in list(self.entries.items()) if os.path.exists(path)}
+        self.entries = entries
+        self.dirty = False
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = temporary_path(self.cache_path)
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(CACHE_VERSION, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def library_roots(base_dir=None):
+    """Normalizes a library root or list of roots; None means LIBRARY_ROOTS."""
+    if base_dir is None:
+        return list(LIBRARY_ROOTS)
+    if isinstance(base_dir, (str, os.PathLike)):
+        return [base_dir]
+    return list(base_dir)
+
+
+def map_roots(function, roots):
+    """Calls function(root) for every root, concurrently when there are several."""
+    if len(roots) <= 1:
+        return [function(root) for root in roots]
+    with ThreadPoolExecutor(max_workers=min(SCAN_WORKERS, len(roots))) as pool:
+        return list(pool.map(function, roots))
+
+
+def scan_root(root):
+    """Lists one root's categories and their condition folders without reading any preset files."""
+    categories = {}
+    try:
+        with profiling.timed("scan"), os.scandir(root) as category_entries:
+            for category_entry in category_entries:
+                if category_entry.name in EXCLUDED_CATEGORIES:
+                    continue  # Skip excluded categories
+                if category_entry.is_dir():
+                    with os.scandir(category_entry.path) as condition_entries:
+                        conditions = [
+                            entry.name for entry in condition_entries
+                            if entry.is_dir() and entry.name != "User"
+                        ]
+                    categories[category_entry.name] = sorted(conditions)
+    except FileNotFoundError:
+        if root not in missing_roots:
+            missing_roots.add(root)
+            print(f"Warning: Preset library not found: {root}")
+    return categories
+
+
+def library_sources(base_dir=None):
+    """Scans every root concurrently into {category: {condition: [roots that contain it]}}."""
+    roots = library_roots(base_dir)
+    sources = {}
+    for root, categories in zip(roots, map_roots(scan_root, roots)):
+        for category, conditions in categories.items():
+            category_sources = sources.setdefault(category, {})
+            for condition in conditions:
+                category_sources.setdefault(condition, []).append(root)
+    return sources
+
+
+def load_categories_and_conditions(base_dir=None):
+    """Lists the categories and condition folders of all roots merged, without reading any preset files."""
+    return {category: sorted(conditions) for category, conditions in library_sources(base_dir).items()}
+
+
+def user_directory(base_dir, category):
+    """Returns the User/ folder a category's presets are written to.
+
+    That is the first root with a User/DEFAULT.xml for the category, else the first root.
+    """
+    roots = library_roots(base_dir)
+    for root in roots:
+        if os.path.exists(os.path.join(root, category, "User", "DEFAULT.xml")):
+            return os.path.join(root, category, "User")
+    return os.path.join(roots[0], category, "User")
+
+
+def generate_output_directories(base_dir, categories):
+    output_dirs = {}
+    for category in categories:
+        output_dirs[category] = os.path.join(user_directory(base_dir, category), "")
+    return output_dirs
+
+
+def scan_condition(base_dir, category, condition):
+    """Returns {path: (mtime_ns, size)} for a condition's preset files across all roots, sorted by path.
+
+    Directory listing order differs between file systems, so sorting keeps the presets,
+    and the blends a seed picks from them, the same on every machine.
+    """
+    stats = {}
+    for root_stats in map_roots(lambda root: scan_presets(os.path.join(root, category, condition)), library_roots(base_dir)):
+        stats.update(root_stats)
+    return dict(sorted(stats.items()))
+
+
+def load_condition(base_dir, category, condition, cache):
+    """Loads the presets of a category/condition from every root that has it, through the cache.
+
+    Each record keeps the path it was read from, so its source library stays known.
+    """
+    presets = []
+    for path in scan_condition(base_dir, category, condition):
+        try:
+            presets.append(cache.get(path))
+        except Exception as e:
+            print(f"Error loading {path}: {e}")
+    return presets
+
+
+def load_factory_effects(base_dir, categories_and_conditions, cache=None):
+    if cache is None:
+        cache = PresetCache()
+    jobs = [(category, condition) for category, conditions in categories_and_conditions.items() for condition in conditions]
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as pool:
+        loaded = pool.map(lambda job: load_condition(base_dir, job[0], job[1], cache), jobs)
+        factory_effects = {category: {} for category in categories_and_conditions}
+        for (category, condition), presets in zip(jobs, loaded):
+            factory_effects[category][condition] = presets
+    cache.save()
+    return factory_effects
+
+
+def scan_presets(directory):
+    """Returns {path: (mtime_ns, size)} for the preset files of a folder, or {} if it is gone."""
+    stats = {}
+    try:
+        with profiling.timed("scan"), os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".xml") and entry.is_file():
+                    stat = entry.stat()
+                    stats[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        pass
+    profiling.count("files_scanned", len(stats))
+    return stats
+
+
+def scan_counters(directory):
+    """Returns {base name: set of counters} for the numbered output files of a folder."""
+    counters = {}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        match = COUNTER_PATTERN.match(name)
+        if match:
+            counters.setdefault(match.group(1), set()).add(int(match.group(2)))
+    return counters
+
+
+class LibraryWatcher:
+    """Keeps loaded conditions and User/ output counters in sync with the SubPresets tree.
+
+    poll() re-lists the folder tree and the conditions that were loaded, re-parses only
+    files whose mtime or size changed (through the PresetCache) and reports what changed.
+    Output names come from per-category counters, so reserving one does not re-list User/.
+    base_dir may be one library root or several (see library_roots).
+    load() and poll() are meant for one background thread; reserve_counter() may be
+    called from any thread.
+    """
+
+    def __init__(self, base_dir=None, cache=None):
+        self.roots = library_roots(base_dir)
+        self.cache = cache
+        self.categories = None
+        self.stats = {}      # (category, condition) -> {path: (mtime_ns, size)}
+        self.records = {}    # (category, condition) -> {path: PresetRecord}
+        self.lock = threading.Lock()
+        self.counters = {}   # category -> (User/ mtime_ns, User/ path, {base name: set of counters})
+        self.next_free = {}  # (category, base name) -> lowest counter that may be free
+
+    def load(self, category, condition):
+        """Loads a condition's presets and starts watching its folder for changes."""
+        if self.cache is None:
+            self.cache = PresetCache()
+        key = (category, condition)
+        self.stats[key] = {}
+        self.records[key] = {}
+        self.apply(key, scan_condition(self.roots, category, condition))
+        self.cache.save()
+        return self.presets(key)
+
+    def presets(self, key):
+        """Returns a watched condition's records in path order, like load_condition()."""
+        records = self.records[key]
+        return [records[path] for path in self.stats[key] if path in records]
+
+    def apply(self, key, stats):
+        """Applies a folder listing to a watched condition; returns True if anything changed."""
+        old_stats, records = self.stats[key], self.records[key]
+        changed = False
+        for path in old_stats.keys() - stats.keys():
+            records.pop(path, None)
+            changed = True
+        for path, stat in stats.items():
+            if old_stats.get(path) == stat:
+                continue
+            try:
+                records[path] = self.cache.get(path)
+            except Exception as e:
+                records.pop(path, None)
+                print(f"Error loading {path}: {e}")
+            changed = True
+        self.stats[key] = stats
+        return changed
+
+    def poll(self):
+        """Picks up changes since the last poll.
+
+        Returns (categories, changed): the new {category: conditions} if the folder tree
+        changed (else None) and {(category, condition): presets} for every watched condition
+        whose files changed. Conditions whose folder disappeared stop being watched.
+        """
+        categories = load_categories_and_conditions(self.roots)
+        tree_changed = categories != self.categories
+        self.categories = categories
+
+        changed = {}
+        for key in list(self.stats):
+            category, condition = key
+            if condition not in categories.get(category, ()):
+                del self.stats[key], self.records[key]
+                continue
+            if self.apply(key, scan_condition(self.roots, category, condition)):
+                changed[key] = self.presets(key)
+        if changed and self.cache is not None:
+            self.cache.save()
+
+        with self.lock:
+            for category in list(self.counters):
+                self.refresh_counters(category)
+        return (categories if tree_changed else None), changed
+
+    def refresh_counters(self, category):
+        # Only re-list User/ when its mtime says files were added, removed or renamed
+        user_dir = user_directory(self.roots, category)
+        try:
+            mtime = os.stat(user_dir).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        cached = self.counters.get(category)
+        if cached is not None and cached[:2] == (mtime, user_dir):
+            return
+        self.counters[category] = (mtime, user_dir, scan_counters(user_dir))
+        for key in [key for key in self.next_free if key[0] == category]:
+            del self.next_free[key]
+
+    def reserve_counter(self, category, base_name):
+        """Returns the lowest free counter for base_name in the category's User/ folder.
+
+        The counter counts as used from then on, so repeated calls hand out distinct names.
+        """
+        with self.lock:
+            if category not in self.counters:
+                self.refresh_counters(category)
+            _, user_dir, counters = self.counters[category]
+            used = counters.setdefault(base_name, set())
+            counter = self.next_free.get((category, base_name), 1)
+            # The exists check catches files written since the last poll, e.g. by a batch run
+            while counter in used or os.path.exists(os.path.join(user_dir, f"{base_name}_{counter}.xml")):
+                used.add(counter)
+                counter += 1
+            used.add(counter)
+            self.next_free[(category, base_name)] = counter + 1
+            return counter
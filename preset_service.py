@@ -0,0 +1,346 @@
+"""Long-running local service that keeps presets parsed and blends them on request.
+
+Clients send one JSON object per line over a Unix socket (or TCP on localhost) and get
+one JSON reply per line, matched by "id" since replies may come back out of order:
+
+    {"id": 1, "op": "blend", "inputs": ["a.xml", "b.xml"], "weights": [0.3, 0.7]}
+    {"id": 1, "ok": true, "xml": "<...>"}
+
+Operations:
+    blend     inputs, weights, groups, discrete, rule, output
+    sweep     inputs, steps, easing, output (a directory or pattern containing {step})
+    generate  category, conditions and the options of generate_variants (count, seed,
+              pairing, dedupe, size, weights, overrides, discrete, rule, jitter,
+              explore, concentration, archive)
+    stats     profiling counters and stage timings
+    ping
+
+Blend weights are relative and scaled to sum to 1. Blends and sweeps reply with the
+preset XML, or write it when given an output path and reply with the written paths.
+Failed requests reply {"id": ..., "ok": false, "error": ...}.
+
+Input files stay parsed between requests until they change on disk, blended rows are
+memoized (see PresetBatch.blend_cached), and the library cache, category templates and
+neighbour indexes stay warm between generate requests.
+Blend and sweep requests that arrive while a batch is being blended are queued and then
+coalesced: requests for the same inputs and options become one weight matrix and are
+blended in a single call.
+"""
+import asyncio
+import ipaddress
+import json
+import os
+import signal
+import socket
+import stat
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import profiling
+from effects_generator import generate_variants
+from preset_core import LRUCache, load_batch, normalize_weights, sweep_output_path, sweep_weights
+from preset_library import PresetCache, load_categories_and_conditions
+from preset_writer import write_atomic
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "mut8current.sock")
+DEFAULT_HOST = "127.0.0.1"
+
+# Longest accepted request line
+REQUEST_LIMIT = 1024 * 1024
+
+# Input file lists whose parsed presets are kept between requests; the least recently used is dropped first
+MAX_BATCHES = 64
+
+GENERATE_OPTIONS = (
+    "pairing", "dedupe", "size", "weights", "overrides", "discrete", "rule", "jitter", "explore", "concentration", "archive"
+)
+
+
+class PresetService:
+    """Request handlers and blend batching; see the module docstring for the protocol.
+
+    Blending, rendering and writing run on one worker thread and generate runs on
+    another, so the event loop keeps reading requests while either is busy.
+    """
+
+    def __init__(self, library=None, store=None, workers=None):
+        self.library = library
+        self.store = store
+        self.workers = workers
+        self.cache = PresetCache()
+        self.batches = LRUCache(MAX_BATCHES, "service_inputs")  # input paths -> (file stats, PresetBatch)
+        self.pending = []    # queued blends: [inputs, weights, options, outputs, future]
+        self.flushing = None
+        self.rng = np.random.default_rng()
+        self.blend_executor = ThreadPoolExecutor(1)
+        self.generate_executor = ThreadPoolExecutor(1)
+
+    def close(self):
+        self.blend_executor.shutdown()
+        self.generate_executor.shutdown()
+        self.cache.save()
+
+    async def handle(self, reader, writer):
+        """Serves one client connection, answering its requests concurrently."""
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    await self.reply(writer, lock, {"ok": False, "error": "Request line too long."})
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(self.respond(line, writer, lock))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, line, writer, lock):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Requests must be JSON objects.")
+            request_id = request.get("id")
+            handler = getattr(self, f"op_{request.get('op')}", None)
+            if handler is None:
+                raise ValueError(f"Unknown op: {request.get('op')}")
+            reply = {"id": request_id, "ok": True}
+            reply.update(await handler(request))
+        except Exception as e:
+            reply = {"id": request_id, "ok": False, "error": str(e)}
+        await self.reply(writer, lock, reply)
+
+    async def reply(self, writer, lock, reply):
+        async with lock:
+            writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+            await writer.drain()
+
+    async def op_ping(self, request):
+        return {}
+
+    async def op_stats(self, request):
+        return {"stats": profiling.snapshot()}
+
+    async def op_blend(self, request):
+        inputs = request["inputs"]
+        weights = request.get("weights") or [1.0 / len(inputs)] * len(inputs)
+        output = request.get("output")
+        texts = await self.blend(inputs, [weights], request, [output] if output else None)
+        return {"written": [output]} if output else {"xml": texts[0]}
+
+    async def op_sweep(self, request):
+        inputs = request["inputs"]
+        steps = int(request["steps"])
+        weights = sweep_weights(len(inputs), steps, request.get("easing", "linear"))
+        output = request.get("output")
+        outputs = [sweep_output_path(output, step) for step in range(steps)] if output else None
+        texts = await self.blend(inputs, weights, request, outputs)
+        return {"written": outputs} if output else {"xml": texts}
+
+    async def op_generate(self, request):
+        options = {key: request[key] for key in GENERATE_OPTIONS if key in request}
+        loop = asyncio.get_running_loop()
+        summary = await loop.run_in_executor(
+            self.generate_executor, lambda: self.generate(
+                request["category"], request.get("conditions"), int(request.get("count", 1)), request.get("seed"), options
+            )
+        )
+        return {"summary": summary}
+
+    def generate(self, category, conditions, count, seed, options):
+        if not conditions:
+            if self.store is not None:
+                categories = self.store.categories_and_conditions()
+            else:
+                categories = load_categories_and_conditions(self.library)
+            conditions = categories.get(category, [])
+        jobs = [(category, condition) for condition in conditions]
+        return generate_variants(
+            self.library, jobs, count, workers=self.workers, seed=seed, cache=self.cache, store=self.store, **options
+        )
+
+    async def blend(self, inputs, weights, request, outputs):
+        """Queues a (rows x inputs) weight matrix for the next batch; returns the rendered rows.
+
+        With outputs (one path per row) the rows are written there instead and None is returned.
+        """
+        weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        if weights.shape[1] != len(inputs):
+            raise ValueError(f"Expected {len(inputs)} weights per row, got {weights.shape[1]}.")
+        weights = normalize_weights(weights)
+        options = {key: request[key] for key in ("groups", "discrete", "rule") if request.get(key)}
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append([tuple(inputs), weights, options, outputs, future])
+        if self.flushing is None:
+            self.flushing = asyncio.create_task(self.flush())
+        return await future
+
+    async def flush(self):
+        # Requests queued while a batch runs on the worker thread go into the next batch
+        loop = asyncio.get_running_loop()
+        try:
+            while self.pending:
+                pending, self.pending = self.pending, []
+                results = await loop.run_in_executor(self.blend_executor, self.run_batch, pending)
+                for item, result in zip(pending, results):
+                    future = item[4]
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+        finally:
+            self.flushing = None
+
+    def run_batch(self, pending):
+        """Blends queued requests, one matrix per set of inputs and options; runs on the worker thread."""
+        results = [None] * len(pending)
+        groups = {}
+        for number, (inputs, _, options, _, _) in enumerate(pending):
+            # Only the option names are sorted; group patterns keep their order, since later ones win
+            key = json.dumps([[name, options[name]] for name in sorted(options)])
+            groups.setdefault((inputs, key), []).append(number)
+        profiling.count("service_requests", len(pending))
+        profiling.count("service_batches", len(groups))
+
+        for (inputs, _), numbers in groups.items():
+            options = pending[numbers[0]][2]
+            try:
+                batch = self.batch(inputs)
+                weights = np.concatenate([pending[number][1] for number in numbers])
+                blended = batch.blend_cached(
+                    weights, options.get("groups"), options.get("discrete", ()), options.get("rule", "random"), self.rng
+                )
+            except Exception as e:
+                for number in numbers:
+                    results[number] = e
+                continue
+
+            start = 0
+            for number in numbers:
+                rows = len(pending[number][1])
+                outputs = pending[number][3]
+                try:
+                    texts = [batch.render(values) for values in blended[start:start + rows]]
+                    if outputs:
+                        for path, text in zip(outputs, texts):
+                            write_atomic(path, text, make_dirs=True)
+                        texts = None
+                    results[number] = texts
+                except Exception as e:
+                    results[number] = e
+                start += rows
+        return results
+
+    def batch(self, inputs):
+        """Returns the PresetBatch of a set of input files, re-parsing them only if one changed."""
+        stats = tuple((info.st_mtime_ns, info.st_size) for info in map(os.stat, inputs))
+        cached = self.batches.get(inputs)
+        if cached is not None and cached[0] == stats:
+            return cached[1]
+        xml_list = []
+        for path in inputs:
+            with open(path, "r") as f:
+                xml_list.append(f.read())
+        # Files that changed back, or copies of other inputs, are found by content
+        batch = load_batch(xml_list)
+        self.batches.put(inputs, (stats, batch))
+        return batch
+
+
+def claim_socket(socket_path):
+    """Removes a socket file left behind by a service that is no longer running.
+
+    Paths that are not sockets are never removed.
+    """
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise RuntimeError(f"{socket_path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX) as probe:
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            os.remove(socket_path)
+            return
+    raise RuntimeError(f"A service is already listening on {socket_path}")
+
+
+def check_loopback(host):
+    """Refuses hosts that are reachable from other machines; the service has no authentication."""
+    if not host:
+        raise ValueError("Refusing to listen on all interfaces: the service only accepts loopback addresses.")
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)}
+    except socket.gaierror as e:
+        raise ValueError(f"Can't resolve host {host}: {e}")
+    if not all(ipaddress.ip_address(address.split("%")[0]).is_loopback for address in addresses):
+        raise ValueError(f"Refusing to listen on {host}: the service only accepts loopback addresses.")
+
+
+async def run_service(service, socket_path=None, host=DEFAULT_HOST, port=None, ready=None):
+    if port is not None:
+        check_loopback(host)
+        server = await asyncio.start_server(service.handle, host, port, limit=REQUEST_LIMIT)
+        address = f"{host}:{port}"
+    else:
+        socket_path = socket_path or DEFAULT_SOCKET
+        claim_socket(socket_path)
+        server = await asyncio.start_unix_server(service.handle, socket_path, limit=REQUEST_LIMIT)
+        address = socket_path
+    # Stop cleanly, removing the socket, when a process manager sends SIGTERM
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except NotImplementedError:
+        pass
+    try:
+        if ready is not None:
+            ready(address)
+        async with server:
+            await server.serve_forever()
+    finally:
+        if port is None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def serve(library=None, store=None, socket_path=None, host=DEFAULT_HOST, port=None, workers=None, ready=None):
+    """Runs the service until interrupted or terminated, on a Unix socket or, given a port, on TCP.
+
+    The TCP host must be a loopback address, since any client can read and write files.
+
+    ready(address) is called once the service accepts connections.
+    """
+    service = PresetService(library, store, workers)
+    try:
+        asyncio.run(run_service(service, socket_path, host, port, ready))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        service.close()
+
+
+def request(message, socket_path=None, host=DEFAULT_HOST, port=None):
+    """Sends one request to a running service and returns its reply; for scripts and tests."""
+    if port is not None:
+        connection = socket.create_connection((host, port))
+    else:
+        connection = socket.socket(socket.AF_UNIX)
+        connection.connect(socket_path or DEFAULT_SOCKET)
+    with connection, connection.makefile("rb") as replies:
+        connection.sendall(json.dumps(message).encode("utf-8") + b"\n")
+        return json.loads(replies.readline())
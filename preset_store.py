@@ -0,0 +1,135 @@
+"""Memory-mapped columnar export of a parsed preset library.
+
+A store is a folder holding the parameter values of every preset as one contiguous array
+plus string tables:
+
+    values.npy          (all parameters x 2) unmapped/mapped values, one contiguous column each
+    offsets.npy         (presets + 1) start row of each preset in values and tags
+    tags.npy            (all parameters) index of each parameter's tag in the tag table
+    presets.npy         UTF-8 bytes of each preset's JSON [name, path, UUID, Node_Properties]
+    preset_offsets.npy  (presets + 1) start byte of each preset in presets.npy
+    strings.json        tag table and the {category: {condition: [first, end preset]}} layout
+
+The arrays are opened with np.load(mmap_mode="r") and a preset's strings are only decoded
+when its record is built, so opening a store reads just the tags and layout, whatever the
+number of presets, and every process using it shares the operating system's copy of the
+data. Records are only built for the conditions that are actually loaded, and their
+values are read-only views into the mapped file.
+"""
+import json
+import os
+import shutil
+import sys
+from itertools import chain
+
+import numpy as np
+
+import profiling
+from preset_library import PresetRecord
+from preset_writer import temporary_path
+
+STORE_VERSION = 2
+
+
+def export_store(path, factory_effects, dtype=np.float64):
+    """Writes {category: {condition: [PresetRecord]}} (see load_factory_effects) as a store.
+
+    dtype float32 halves the size of the values; float64 keeps them exact. The store is
+    built in a temporary folder next to path and swapped in when complete.
+    """
+    tag_ids = {}
+    presets, preset_offsets, layout = [], [0], {}
+    values, tags, offsets = [], [], [0]
+    for category, conditions in factory_effects.items():
+        layout[category] = {}
+        for condition, records in conditions.items():
+            # Each condition's presets are stored next to each other
+            first = len(presets)
+            for record in records:
+                entry = json.dumps([record.name, record.path, record.uuid, record.node_properties]).encode("utf-8")
+                presets.append(entry)
+                preset_offsets.append(preset_offsets[-1] + len(entry))
+                values.append(record.values)
+                tags.append([tag_ids.setdefault(tag, len(tag_ids)) for tag in record.tags])
+                offsets.append(offsets[-1] + len(record.tags))
+            layout[category][condition] = [first, len(presets)]
+
+    value_columns = np.concatenate(values) if values else np.empty((0, 2))
+    strings = {"version": STORE_VERSION, "tags": list(tag_ids), "layout": layout}
+
+    tmp_path = temporary_path(path)
+    os.makedirs(tmp_path)
+    try:
+        # Fortran order keeps the unmapped and mapped columns contiguous in the file
+        np.save(os.path.join(tmp_path, "values.npy"), np.asfortranarray(value_columns, dtype=dtype))
+        np.save(os.path.join(tmp_path, "offsets.npy"), np.array(offsets, dtype=np.int64))
+        np.save(os.path.join(tmp_path, "tags.npy"), np.fromiter(chain.from_iterable(tags), dtype=np.int32, count=offsets[-1]))
+        np.save(os.path.join(tmp_path, "presets.npy"), np.frombuffer(b"".join(presets), dtype=np.uint8))
+        np.save(os.path.join(tmp_path, "preset_offsets.npy"), np.array(preset_offsets, dtype=np.int64))
+        with open(os.path.join(tmp_path, "strings.json"), "w", encoding="utf-8") as f:
+            json.dump(strings, f)
+        replace_store(tmp_path, path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    return len(presets)
+
+
+def replace_store(tmp_path, path):
+    """Moves a finished store folder into place, removing any store it replaces.
+
+    Processes that still have the old store mapped keep reading their copy until they close it.
+    """
+    if not os.path.exists(path):
+        os.replace(tmp_path, path)
+        return
+    old_path = temporary_path(path)
+    os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+class PresetStore:
+    """Read-only view of an exported store; stands in for scanning and parsing the library."""
+
+    def __init__(self, path):
+        self.path = path
+        with profiling.timed("store_open"):
+            with open(os.path.join(path, "strings.json"), encoding="utf-8") as f:
+                strings = json.load(f)
+            if strings.get("version") != STORE_VERSION:
+                raise ValueError(f"Unsupported preset store version in {path}: {strings.get('version')}")
+            self.values = np.load(os.path.join(path, "values.npy"), mmap_mode="r")
+            self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+            self.tag_ids = np.load(os.path.join(path, "tags.npy"), mmap_mode="r")
+            self.preset_strings = np.load(os.path.join(path, "presets.npy"), mmap_mode="r")
+            self.preset_offsets = np.load(os.path.join(path, "preset_offsets.npy"), mmap_mode="r")
+        self.tags = [sys.intern(tag) for tag in strings["tags"]]
+        self.layout = strings["layout"]
+        self.records = {}  # preset number -> PresetRecord, built on first use
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def categories_and_conditions(self):
+        """Returns {category: [conditions]}, like load_categories_and_conditions()."""
+        return {category: list(conditions) for category, conditions in self.layout.items()}
+
+    def record(self, number):
+        record = self.records.get(number)
+        if record is None:
+            start, end = int(self.preset_offsets[number]), int(self.preset_offsets[number + 1])
+            name, path, uuid, node_properties = json.loads(self.preset_strings[start:end].tobytes().decode("utf-8"))
+            start, end = int(self.offsets[number]), int(self.offsets[number + 1])
+            tags = tuple(self.tags[i] for i in self.tag_ids[start:end].tolist())
+            record = self.records[number] = PresetRecord(name, path, uuid, tags, self.values[start:end], node_properties)
+        return record
+
+    def load_condition(self, category, condition):
+        """Returns the PresetRecords of a category/condition, or [] if the store lacks it.
+
+        Repeated calls return the same record objects, so per-record caches such as
+        ParameterSchema projections stay valid.
+        """
+        first, end = self.layout.get(category, {}).get(condition, (0, 0))
+        return [self.record(number) for number in range(first, end)]
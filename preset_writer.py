@@ -0,0 +1,121 @@
+import os
+import zipfile
+from uuid import uuid4
+
+import profiling
+
+
+def temporary_path(path):
+    """Returns a unique hidden name next to path for staging its new contents."""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.{uuid4().hex[:12]}.tmp")
+
+
+def write_atomic(path, text, make_dirs=False):
+    """Writes text to path through a temporary file in the same folder and os.replace.
+
+    Readers (the plugin, a library watcher) see either the old file or the complete new
+    one, never a partly written preset. With make_dirs the folder is created if missing.
+    """
+    directory = os.path.dirname(path)
+    if make_dirs and directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = temporary_path(path)
+    with profiling.timed("write"):
+        try:
+            with open(tmp_path, "x", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    profiling.count("presets_written")
+    profiling.count("bytes_written", len(text))
+
+
+def reserve_path(directory, base_name, start=1):
+    """Claims the first free <base_name>_<counter>.xml at or after start; returns (path, counter).
+
+    The name is claimed by creating an empty placeholder with O_EXCL, so generators running
+    in other threads or processes can never pick the same file. write_atomic() later
+    replaces the placeholder.
+    """
+    counter = start
+    while True:
+        path = os.path.join(directory, f"{base_name}_{counter}.xml")
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+        except FileExistsError:
+            counter += 1
+            continue
+        return path, counter
+
+
+def reserve_paths(directory, base_name, counters):
+    """Claims one output file per suggested counter, skipping ahead past any taken since.
+
+    Returns [(path, counter)] in order.
+    """
+    reserved = []
+    next_start = 1
+    for counter in counters:
+        path, claimed = reserve_path(directory, base_name, max(counter, next_start))
+        reserved.append((path, claimed))
+        next_start = claimed + 1
+    return reserved
+
+
+def release_placeholders(paths):
+    """Removes reserved files that were never written, e.g. after a failed worker task."""
+    for path in paths:
+        try:
+            if os.path.getsize(path) == 0:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+class ArchiveWriter:
+    """Collects a run's presets into one zip archive, published atomically when closed.
+
+    Use as a context manager; if the run fails the partial archive is discarded.
+    """
+
+    def __init__(self, path, compression=zipfile.ZIP_DEFLATED):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.tmp_path = temporary_path(path)
+        self.archive = zipfile.ZipFile(self.tmp_path, "x", compression)
+        self.names = set()
+
+    def add(self, name, text):
+        """Adds one preset under name, which must be unique in the archive."""
+        if name in self.names:
+            raise ValueError(f"Duplicate archive member: {name}")
+        with profiling.timed("write"):
+            self.archive.writestr(name, text)
+        self.names.add(name)
+        profiling.count("presets_written")
+        profiling.count("bytes_written", len(text))
+
+    def close(self):
+        self.archive.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.archive.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
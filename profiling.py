@@ -0,0 +1,158 @@
+"""Counters and per-stage latency histograms for the scan, parse, blend and write hot paths.
+
+Profiling is off unless enable() is called or MUT8_PROFILE=1 is set. While it is off,
+count() is a flag check and timed() hands back a shared do-nothing context manager, so
+the instrumented code costs next to nothing:
+
+    with profiling.timed("write"):
+        f.write(text)
+    profiling.count("presets_written")
+
+Worker processes start with empty stats; submit() their tasks and collect them with
+result(), which merges each worker's stats into the parent's.
+"""
+import os
+import threading
+import time
+
+# Upper bounds in seconds of the latency histogram buckets; a last bucket holds anything slower
+BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0, 10.0)
+BUCKET_LABELS = ("<10us", "<100us", "<1ms", "<10ms", "<100ms", "<1s", "<10s", ">=10s")
+
+enabled = os.environ.get("MUT8_PROFILE", "") not in ("", "0")
+lock = threading.Lock()
+counters = {}
+stages = {}  # stage -> [calls, total seconds, max seconds, bucket counts]
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class StageTimer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+def reset():
+    with lock:
+        counters.clear()
+        stages.clear()
+
+
+def timed(stage):
+    """Returns a context manager that adds its duration to the stage's histogram."""
+    return StageTimer(stage) if enabled else NULL_TIMER
+
+
+def count(name, amount=1):
+    """Adds amount to a named counter."""
+    if enabled:
+        with lock:
+            counters[name] = counters.get(name, 0) + amount
+
+
+def record(stage, seconds, calls=1):
+    bucket = 0
+    while bucket < len(BUCKETS) and seconds >= BUCKETS[bucket]:
+        bucket += 1
+    with lock:
+        stats = stages.get(stage)
+        if stats is None:
+            stats = stages[stage] = [0, 0.0, 0.0, [0] * len(BUCKET_LABELS)]
+        stats[0] += calls
+        stats[1] += seconds
+        stats[2] = max(stats[2], seconds)
+        stats[3][bucket] += calls
+
+
+def snapshot():
+    """Returns a picklable copy of the counters and stage stats."""
+    with lock:
+        return {
+            "counters": dict(counters),
+            "stages": {stage: [calls, total, peak, list(buckets)] for stage, (calls, total, peak, buckets) in stages.items()},
+        }
+
+
+def merge(other):
+    """Adds a snapshot, e.g. from a worker process, to the stats of this process."""
+    with lock:
+        for name, value in other["counters"].items():
+            counters[name] = counters.get(name, 0) + value
+        for stage, (calls, total, peak, buckets) in other["stages"].items():
+            stats = stages.get(stage)
+            if stats is None:
+                stages[stage] = [calls, total, peak, list(buckets)]
+                continue
+            stats[0] += calls
+            stats[1] += total
+            stats[2] = max(stats[2], peak)
+            stats[3] = [a + b for a, b in zip(stats[3], buckets)]
+
+
+def call_profiled(profile, function, *args):
+    """Worker process entry point: runs function, profiled if asked, and returns (result, snapshot or None)."""
+    enable(profile)
+    if not profile:
+        return function(*args), None
+    reset()
+    return function(*args), snapshot()
+
+
+def submit(pool, function, *args):
+    """Submits function(*args) to a process pool, profiled in the worker if profiling is enabled here."""
+    return pool.submit(call_profiled, enabled, function, *args)
+
+
+def result(future):
+    """Returns the result of a submit()ted task, merging the worker's stats."""
+    value, stats = future.result()
+    if stats is not None:
+        merge(stats)
+    return value
+
+
+def format_report(stats=None):
+    """Formats a snapshot (default: the current stats) as a plain-text table."""
+    stats = stats if stats is not None else snapshot()
+    lines = []
+    if stats["stages"]:
+        header = f"{'stage':<12}{'calls':>9}{'total s':>10}{'mean ms':>10}{'max ms':>10}  " + " ".join(
+            f"{label:>7}" for label in BUCKET_LABELS
+        )
+        lines.append(header)
+        for stage, (calls, total, peak, buckets) in sorted(stats["stages"].items()):
+            lines.append(
+                f"{stage:<12}{calls:>9}{total:>10.3f}{total / calls * 1000:>10.3f}{peak * 1000:>10.3f}  "
+                + " ".join(f"{bucket:>7}" for bucket in buckets)
+            )
+    if stats["counters"]:
+        if lines:
+            lines.append("")
+        width = max(len(name) for name in stats["counters"])
+        for name, value in sorted(stats["counters"].items()):
+            lines.append(f"{name:<{width}}  {value:>12,}")
+    return "\n".join(lines) if lines else "No stats recorded."
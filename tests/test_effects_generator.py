@@ -0,0 +1,61 @@
+import os
+import re
+import xml.etree.ElementTree as ET
+
+from effects_generator import generate_variants
+from preset_library import PresetCache
+
+
+def preset(name, value, node_properties=""):
+    return f"""<SubPreset name="{name}">
+  <Meta UUID="u-{name}"/>
+  <Node_Properties SubPresetName="{name}"{node_properties}/>
+  <Parameters>
+    <A unmapped_value="{value}" mapped_value="{value}"/>
+    <B unmapped_value="{1 - value}" mapped_value="{value / 2}"/>
+  </Parameters>
+</SubPreset>"""
+
+
+def make_library(root):
+    for category, node_properties in (("Filter", ""), ("Polar Distortion", ' PositiveDistType="1"')):
+        os.makedirs(root / category / "User")
+        (root / category / "User" / "DEFAULT.xml").write_text(preset("DEFAULT", 0.5, node_properties))
+        os.makedirs(root / category / "Soft")
+        for number, value in enumerate((0.0, 0.2, 0.45, 0.7, 1.0)):
+            extra = f' PositiveDistType="{number}" NegativeDistType="{number + 1}"' if node_properties else ""
+            (root / category / "Soft" / f"p{number}.xml").write_text(preset(f"p{number}", value, extra))
+
+
+def generate(root, category, seed):
+    summary = generate_variants(
+        str(root), [(category, "Soft")], 3, workers=1, seed=seed, cache=PresetCache(str(root / "cache.pickle"))
+    )
+    assert not summary["errors"]
+    return sorted(summary["written"])
+
+
+def without_uuids(path):
+    with open(path) as f:
+        return re.sub(r'UUID="[^"]*"', "", f.read())
+
+
+def test_same_seed_generates_the_same_presets(tmp_path):
+    # user-021
+    make_library(tmp_path / "one")
+    make_library(tmp_path / "two")
+    first = generate(tmp_path / "one", "Filter", 7)
+    second = generate(tmp_path / "two", "Filter", 7)
+    assert len(first) == 3
+    assert [os.path.basename(path) for path in first] == [os.path.basename(path) for path in second]
+    assert [without_uuids(path) for path in first] == [without_uuids(path) for path in second]
+
+
+def test_only_polar_distortion_sets_distortion_types(tmp_path):
+    # user-010
+    make_library(tmp_path)
+    for path in generate(tmp_path, "Filter", 1):
+        assert ET.parse(path).find("Node_Properties").keys() == ["SubPresetName"]
+    for path in generate(tmp_path, "Polar Distortion", 1):
+        node = ET.parse(path).find("Node_Properties")
+        assert {"PositiveDistType", "NegativeDistType"} <= set(node.keys())
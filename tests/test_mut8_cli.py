@@ -0,0 +1,60 @@
+import json
+import xml.etree.ElementTree as ET
+
+from mut8_cli import load_manifest, main
+
+PRESET = '<SubPreset name="{name}"><Parameters><A unmapped_value="{value}" mapped_value="{value}"/></Parameters></SubPreset>'
+
+
+def write_inputs(directory):
+    for name, value in (("a", 0.0), ("b", 1.0), ("c", 3.0)):
+        (directory / f"{name}.xml").write_text(PRESET.format(name=name, value=value))
+
+
+def value(path):
+    return float(ET.parse(path).find("Parameters/A").get("unmapped_value"))
+
+
+def test_csv_manifest_rows_become_jobs_with_resolved_paths(tmp_path):
+    # user-006
+    manifest = tmp_path / "pack.csv"
+    manifest.write_text(
+        "inputs,weights,steps,easing,output\n"
+        "a.xml; b.xml,1;3,,,out/mix.xml\n"
+        "a.xml;b.xml;c.xml,,4,smoothstep,morph/abc_{step}.xml\n"
+    )
+    assert load_manifest(str(manifest)) == [
+        {"inputs": [str(tmp_path / "a.xml"), str(tmp_path / "b.xml")], "output": str(tmp_path / "out" / "mix.xml"),
+         "weights": [1.0, 3.0]},
+        {"inputs": [str(tmp_path / name) for name in ("a.xml", "b.xml", "c.xml")],
+         "output": str(tmp_path / "morph" / "abc_{step}.xml"), "steps": 4, "easing": "smoothstep"},
+    ]
+
+
+def test_json_manifest_accepts_a_job_list_or_object(tmp_path):
+    # user-006
+    job = {"inputs": ["a.xml", "b.xml"], "weights": [1, 1], "groups": {"A*": [1, 0]}, "output": "mix.xml"}
+    (tmp_path / "list.json").write_text(json.dumps([job]))
+    (tmp_path / "object.json").write_text(json.dumps({"jobs": [job]}))
+    expected = [dict(job, inputs=[str(tmp_path / "a.xml"), str(tmp_path / "b.xml")], output=str(tmp_path / "mix.xml"))]
+    assert load_manifest(str(tmp_path / "list.json")) == expected
+    assert load_manifest(str(tmp_path / "object.json")) == expected
+
+
+def test_manifest_runs_blends_and_sweeps(tmp_path):
+    # user-006
+    write_inputs(tmp_path)
+    (tmp_path / "pack.json").write_text(json.dumps([
+        {"inputs": ["a.xml", "b.xml"], "weights": [1, 3], "output": "out/mix.xml"},
+        {"inputs": ["a.xml", "b.xml", "c.xml"], "steps": 5, "output": "morph/abc_{step}.xml"},
+    ]))
+    assert main(["manifest", str(tmp_path / "pack.json"), "--workers", "1"]) == 0
+    assert value(tmp_path / "out" / "mix.xml") == 0.75
+    assert [value(tmp_path / "morph" / f"abc_{step}.xml") for step in range(5)] == [0.0, 0.5, 1.0, 2.0, 3.0]
+
+
+def test_generate_fails_for_an_unknown_category(tmp_path, capsys):
+    # user-006
+    (tmp_path / "Filter" / "Soft").mkdir(parents=True)
+    assert main(["generate", "--library", str(tmp_path), "--category", "Filtre"]) == 2
+    assert "Filtre" in capsys.readouterr().err
@@ -0,0 +1,196 @@
+import io
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+
+from preset_core import (
+    LRUCache, PresetBatch, PresetTemplate, extract_preset, interpolate_presets, iter_sweep_weights, load_batch,
+    normalize_weights, sweep_output_path, write_sweep
+)
+
+
+def nested_preset(name, outer, inner):
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<SubPreset name="{name}">
+  <Parameters>
+    <A unmapped_value="{outer}" mapped_value="{outer}"/>
+    <N>
+      <Parameters>
+        <A unmapped_value="{inner}" mapped_value="{inner}"/>
+      </Parameters>
+    </N>
+  </Parameters>
+</SubPreset>
+"""
+
+
+def test_extract_preset_reads_nested_groups_in_document_order():
+    # user-009
+    _, _, _, tags, values = extract_preset(io.StringIO(nested_preset("p", 10, 20)))
+    assert tags == ("A", "N", "A")
+    assert values[[0, 2], 0].tolist() == [10.0, 20.0]
+
+
+def deep_preset(name, values):
+    return f"""<SubPreset name="{name}">
+  <Parameters>
+    <A unmapped_value="{values[0]}" mapped_value="{values[0]}"/>
+    <N>
+      <Parameters>
+        <A unmapped_value="{values[1]}" mapped_value="{values[1]}"/>
+        <M>
+          <Parameters>
+            <A unmapped_value="{values[2]}" mapped_value="{values[2]}"/>
+          </Parameters>
+        </M>
+      </Parameters>
+    </N>
+  </Parameters>
+</SubPreset>
+"""
+
+
+def parameter_values_list(xml):
+    return [float(param.get("unmapped_value")) for param in ET.fromstring(xml).iter("A")]
+
+
+def test_extract_preset_reads_three_nesting_levels_in_document_order():
+    # user-009
+    xml = deep_preset("p", (1, 2, 3))
+    _, _, _, tags, values = extract_preset(io.StringIO(xml))
+    assert tags == tuple(param.tag for param in ET.fromstring(xml).findall(".//Parameters/*"))
+    assert values[[0, 2, 4], 0].tolist() == [1.0, 2.0, 3.0]
+    blended = parameter_values_list(interpolate_presets([deep_preset("a", (1, 2, 3)), deep_preset("b", (10, 20, 30))], [0, 1]))
+    assert blended == [10.0, 20.0, 30.0]
+
+
+def test_blend_keeps_repeated_nested_tags_in_their_own_columns():
+    # user-009
+    batch = PresetBatch([nested_preset("p1", 1, 2), nested_preset("p2", 10, 20)])
+    blended = batch.blend([0, 1])[0]
+    assert batch.schema.tags == ("A", "N", "A")
+    assert blended[0, 0] == 10.0
+    assert blended[2, 0] == 20.0
+    assert np.array_equal(batch.values[1][[0, 2], 0], [10.0, 20.0])
+
+
+TEMPLATE = """<SubPreset name="DEFAULT">
+  <Node_Properties SubPresetName="DEFAULT" PositiveDistType="3"/>
+  <Parameters>
+    <A unmapped_value="0.25" mapped_value="0.5"/>
+  </Parameters>
+</SubPreset>"""
+
+
+def test_template_leaves_missing_node_properties_out_until_set():
+    # user-010
+    root = ET.fromstring(TEMPLATE)
+    values = np.array([[0.25, 0.5]])
+    plain = PresetTemplate(root, param_path="Parameters/*").render(values)
+    template = PresetTemplate(root, param_path="Parameters/*", node_keys=("PositiveDistType", "NegativeDistType"))
+    assert template.render(values) == plain
+    assert 'NegativeDistType' not in plain
+
+    node = ET.fromstring(template.render(values, node_properties={"NegativeDistType": "2"})).find("Node_Properties")
+    assert node.attrib == {"SubPresetName": "DEFAULT", "PositiveDistType": "3", "NegativeDistType": "2"}
+    node = ET.fromstring(template.render(values, node_properties={"PositiveDistType": "1"})).find("Node_Properties")
+    assert node.attrib == {"SubPresetName": "DEFAULT", "PositiveDistType": "1"}
+
+
+def flat_preset(name, values):
+    params = "".join(f'<{tag} unmapped_value="{u}" mapped_value="{m}"/>' for tag, (u, m) in values.items())
+    return f'<SubPreset name="{name}"><Meta UUID="u-{name}"/><Parameters>{params}</Parameters></SubPreset>'
+
+
+def parameter_values(xml):
+    return {
+        param.tag: (float(param.get("unmapped_value")), float(param.get("mapped_value")))
+        for param in ET.fromstring(xml).find("Parameters")
+    }
+
+
+def test_interpolate_presets_matches_weighted_sum_by_parameter_name():
+    # user-001
+    first = {"A": (0.0, 1.0), "B": (2.0, 4.0), "C": (1.0, 1.0)}
+    # Shuffled order and a missing parameter, which takes the first preset's values
+    second = {"B": (4.0, 8.0), "A": (1.0, 0.0)}
+    blended = parameter_values(interpolate_presets([flat_preset("a", first), flat_preset("b", second)], [0.25, 0.75]))
+    expected = {tag: tuple(0.25 * a + 0.75 * b for a, b in zip(first[tag], second.get(tag, first[tag]))) for tag in first}
+    assert blended.keys() == expected.keys()
+    for tag in expected:
+        assert blended[tag] == pytest.approx(expected[tag])
+
+
+def test_blend_cached_matches_blend():
+    # user-022
+    batch = load_batch([flat_preset("a", {"A": (0.0, 1.0)}), flat_preset("b", {"A": (1.0, 3.0)})])
+    weights = [[1.0, 0.0], [0.5, 0.5], [0.1, 0.9]]
+    assert np.array_equal(batch.blend_cached(weights), batch.blend(weights))
+    assert np.array_equal(batch.blend_cached(weights[::-1]), batch.blend(weights[::-1]))
+
+
+def test_blend_cached_keeps_override_order():
+    # user-022
+    batch = load_batch([flat_preset("a", {"AB": (1.0, 1.0)}), flat_preset("b", {"AB": (0.0, 0.0)})])
+    forward = {"A*": [1, 0], "AB": [0, 1]}
+    backward = dict(reversed(list(forward.items())))
+    assert batch.blend_cached([[0.5, 0.5]], forward)[0, 0, 0] == 0.0
+    assert batch.blend_cached([[0.5, 0.5]], backward)[0, 0, 0] == 1.0
+
+def test_template_renders_defaults_back_to_the_same_preset():
+    # user-010
+    xml = flat_preset("p", {"A": (0.125, 0.5), "B": (3.0, -1.0)})
+    batch = PresetBatch([xml])
+    rendered = batch.template.render(batch.schema.defaults)
+    assert parameter_values(rendered) == parameter_values(xml)
+    assert ET.fromstring(rendered).find("Meta").get("UUID") == "u-p"
+    assert ET.fromstring(batch.render(batch.schema.defaults)).find("Meta").get("UUID") != "u-p"
+
+
+def test_normalize_weights_scales_rows_to_one():
+    # user-006
+    assert np.allclose(normalize_weights([2, 1]), [[2 / 3, 1 / 3]])
+    assert normalize_weights([[1, 1], [0, 4]]).tolist() == [[0.5, 0.5], [0.0, 1.0]]
+    with pytest.raises(ValueError):
+        normalize_weights([0, 0])
+
+
+def test_lru_cache_drops_least_recently_used():
+    # user-022
+    cache = LRUCache(2, "test_cache")
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_sweep_weights_travel_through_the_presets_in_order():
+    # user-007
+    assert np.array_equal(list(iter_sweep_weights(3, 5)), [
+        [1.0, 0.0, 0.0], [0.5, 0.5, 0.0], [0.0, 1.0, 0.0], [0.0, 0.5, 0.5], [0.0, 0.0, 1.0],
+    ])
+    eased = list(iter_sweep_weights(2, 3, "ease_in"))
+    assert np.allclose(eased[1], [0.75, 0.25])
+    with pytest.raises(ValueError):
+        list(iter_sweep_weights(1, 3))
+
+
+def test_sweep_output_paths_fill_the_step_field_or_name_files_in_a_folder():
+    # user-007
+    assert sweep_output_path("morph/lead_{step:02d}.xml", 3) == "morph/lead_03.xml"
+    assert sweep_output_path("morph", 12) == os.path.join("morph", "morph_012.xml")
+
+
+def test_write_sweep_writes_every_step(tmp_path):
+    # user-007
+    xml_list = [flat_preset("a", {"A": (0.0, 0.0)}), flat_preset("b", {"A": (2.0, 4.0)})]
+    written = write_sweep(xml_list, 3, str(tmp_path / "new" / "ab_{step}.xml"))
+    assert written == [str(tmp_path / "new" / f"ab_{step}.xml") for step in range(3)]
+    assert [parameter_values((tmp_path / "new" / f"ab_{step}.xml").read_text())["A"] for step in range(3)] == [
+        (0.0, 0.0), (1.0, 2.0), (2.0, 4.0),
+    ]
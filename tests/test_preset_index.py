@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from preset_core import ParameterSchema
+from preset_index import PresetIndex
+from preset_library import PresetRecord
+
+TAGS = ("A", "B", "C")
+
+
+def make_index(unmapped_rows):
+    schema = ParameterSchema(TAGS, np.zeros((len(TAGS), 2)))
+    records = [
+        PresetRecord(f"p{number}", f"p{number}.xml", None, TAGS, np.column_stack([row, row]), None)
+        for number, row in enumerate(np.asarray(unmapped_rows, dtype=float))
+    ]
+    return PresetIndex(schema, records)
+
+
+@pytest.mark.parametrize("pairing", ["random", "similar", "different"])
+@pytest.mark.parametrize("size", [2, 3, 5])
+def test_pick_groups_draws_distinct_presets(pairing, size):
+    # user-012
+    index = make_index(np.random.default_rng(0).random((6, len(TAGS))))
+    groups = index.pick_groups(500, size, np.random.default_rng(1), pairing)
+    assert groups.shape == (500, size)
+    assert all(len(set(group)) == size for group in groups.tolist())
+    assert groups.min() >= 0 and groups.max() < len(index)
+
+
+def test_pick_groups_needs_enough_presets():
+    # user-012
+    index = make_index([[0, 0, 0], [1, 1, 1]])
+    with pytest.raises(ValueError):
+        index.pick_groups(1, 3, np.random.default_rng(0))
+    with pytest.raises(ValueError):
+        index.pick_groups(1, 2, np.random.default_rng(0), "closest")
+
+
+def test_duplicates_flags_near_copies_of_the_library_and_of_earlier_blends():
+    # user-012
+    index = make_index([[0.0, 0.0, 0.0], [1.0, 1.0, 1.0]])
+    blends = np.array([[0.001, 0.0, 0.0], [0.5, 0.5, 0.5], [0.5, 0.5, 0.501], [0.2, 0.8, 0.5]])
+    vectors = index.vectorize(np.stack([np.column_stack([row, row]) for row in blends]))
+    assert index.duplicates(vectors).tolist() == [True, False, True, False]
+
+
+def test_nearest_and_neighbours_order_by_distance():
+    # user-012
+    index = make_index([[0.0, 0.0, 0.0], [0.1, 0.0, 0.0], [1.0, 1.0, 1.0]])
+    assert [record.name for record, _ in index.neighbours(0, k=2)] == ["p1", "p2"]
+    nearest = index.nearest(np.full((len(TAGS), 2), 0.9), k=3)
+    assert [record.name for record, _ in nearest] == ["p2", "p1", "p0"]
+    assert [distance for _, distance in nearest] == sorted(distance for _, distance in nearest)
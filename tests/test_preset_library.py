@@ -0,0 +1,85 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from preset_library import LibraryWatcher, PresetCache, load_condition
+
+PRESET = """<SubPreset name="{name}">
+  <Parameters>
+    <A unmapped_value="1" mapped_value="1"/>
+  </Parameters>
+</SubPreset>"""
+
+
+def add_preset(directory, name):
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / f"{name}.xml").write_text(PRESET.format(name=name))
+
+
+def test_conditions_load_in_path_order(tmp_path):
+    # user-021
+    condition = tmp_path / "Filter" / "Soft"
+    for name in ("c", "a", "d", "b"):
+        add_preset(condition, name)
+    cache = PresetCache(str(tmp_path / "cache.pickle"))
+
+    names = [record.name for record in load_condition(str(tmp_path), "Filter", "Soft", cache)]
+    assert names == ["a", "b", "c", "d"]
+
+    watcher = LibraryWatcher(str(tmp_path), cache)
+    assert [record.name for record in watcher.load("Filter", "Soft")] == names
+    add_preset(condition, "a0")
+    _, changed = watcher.poll()
+    assert [record.name for record in changed[("Filter", "Soft")]] == ["a", "a0", "b", "c", "d"]
+
+
+def test_reserve_counter_hands_out_distinct_free_counters(tmp_path):
+    # user-013
+    user_dir = tmp_path / "Filter" / "User"
+    add_preset(user_dir, "blended_Filter_Soft_1")
+    add_preset(user_dir, "blended_Filter_Soft_3")
+    watcher = LibraryWatcher(str(tmp_path), PresetCache(str(tmp_path / "cache.pickle")))
+    assert [watcher.reserve_counter("Filter", "blended_Filter_Soft") for _ in range(2)] == [2, 4]
+
+    # Files written since the last poll are skipped too
+    add_preset(user_dir, "blended_Filter_Soft_5")
+    assert watcher.reserve_counter("Filter", "blended_Filter_Soft") == 6
+
+    with ThreadPoolExecutor(8) as pool:
+        counters = list(pool.map(lambda _: watcher.reserve_counter("Filter", "blended_Filter_Soft"), range(40)))
+    assert sorted(counters) == list(range(7, 47))
+
+
+def test_reserve_counter_reuses_counters_freed_before_a_poll(tmp_path):
+    # user-013
+    user_dir = tmp_path / "Filter" / "User"
+    for counter in (1, 2, 3):
+        add_preset(user_dir, f"blended_{counter}")
+    watcher = LibraryWatcher(str(tmp_path), PresetCache(str(tmp_path / "cache.pickle")))
+    assert watcher.reserve_counter("Filter", "blended") == 4
+
+    os.remove(user_dir / "blended_2.xml")
+    # Make the folder's mtime change visibly even on coarse-grained file systems
+    stat = os.stat(user_dir)
+    os.utime(user_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    watcher.poll()
+    assert watcher.reserve_counter("Filter", "blended") == 2
+
+
+def test_poll_reports_changed_and_removed_presets(tmp_path):
+    # user-013
+    condition = tmp_path / "Filter" / "Soft"
+    for name in ("a", "b"):
+        add_preset(condition, name)
+    watcher = LibraryWatcher(str(tmp_path), PresetCache(str(tmp_path / "cache.pickle")))
+    watcher.load("Filter", "Soft")
+    assert watcher.poll() == ({"Filter": ["Soft"]}, {})
+    assert watcher.poll() == (None, {})
+
+    os.remove(condition / "b.xml")
+    (condition / "a.xml").write_text(PRESET.format(name="renamed"))
+    _, changed = watcher.poll()
+    assert [record.name for record in changed[("Filter", "Soft")]] == ["renamed"]
+
+    (tmp_path / "Filter" / "Hard").mkdir()
+    categories, changed = watcher.poll()
+    assert categories == {"Filter": ["Hard", "Soft"]} and changed == {}
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import socket
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+
+from preset_service import PresetService, claim_socket
+
+PRESET = '<SubPreset name="{name}"><Parameters><AB unmapped_value="{value}" mapped_value="{value}"/></Parameters></SubPreset>'
+
+
+def write_inputs(directory):
+    paths = []
+    for name, value in (("a", 1.0), ("b", 0.0)):
+        path = directory / f"{name}.xml"
+        path.write_text(PRESET.format(name=name, value=value))
+        paths.append(str(path))
+    return tuple(paths)
+
+
+@pytest.fixture
+def service():
+    service = PresetService()
+    yield service
+    service.blend_executor.shutdown()
+    service.generate_executor.shutdown()
+
+
+def blended_value(xml):
+    return float(ET.fromstring(xml).find("Parameters/AB").get("unmapped_value"))
+
+
+def test_claim_socket_leaves_other_files_alone(tmp_path):
+    # user-020
+    notes = tmp_path / "notes.txt"
+    notes.write_text("keep me")
+    with pytest.raises(RuntimeError):
+        claim_socket(str(notes))
+    assert notes.read_text() == "keep me"
+
+
+def test_claim_socket_removes_stale_socket(tmp_path):
+    # user-020
+    path = str(tmp_path / "stale.sock")
+    with socket.socket(socket.AF_UNIX) as server:
+        server.bind(path)
+    claim_socket(path)
+    assert not (tmp_path / "stale.sock").exists()
+    claim_socket(path)
+
+
+def test_run_batch_keeps_requests_with_reordered_groups_apart(tmp_path, service):
+    # user-020
+    inputs = write_inputs(tmp_path)
+    forward = {"A*": [1, 0], "AB": [0, 1]}
+    backward = dict(reversed(list(forward.items())))
+    weights = np.array([[0.5, 0.5]])
+    results = service.run_batch([
+        [inputs, weights, {"groups": forward}, None, None],
+        [inputs, weights, {"groups": backward}, None, None],
+    ])
+    assert [blended_value(texts[0]) for texts in results] == [0.0, 1.0]
+
+
+def test_concurrent_blends_are_coalesced_into_one_batch(tmp_path, service):
+    # user-020
+    inputs = write_inputs(tmp_path)
+    batches = []
+    run_batch = service.run_batch
+
+    def counting_run_batch(pending):
+        batches.append(len(pending))
+        return run_batch(pending)
+
+    service.run_batch = counting_run_batch
+
+    async def blend_all():
+        return await asyncio.gather(*(
+            service.blend(inputs, [[weight, 1 - weight]], {}, None) for weight in (0.0, 0.25, 1.0)
+        ))
+
+    results = asyncio.run(blend_all())
+    assert batches == [3]
+    assert [blended_value(texts[0]) for texts in results] == [0.0, 0.25, 1.0]
+
+
+def test_pipelined_replies_are_matched_by_id(tmp_path, service):
+    # user-020
+    inputs = write_inputs(tmp_path)
+    path = str(tmp_path / "service.sock")
+    requests = [
+        {"id": "half", "op": "blend", "inputs": list(inputs), "weights": [1, 1]},
+        {"id": "bad", "op": "blend", "inputs": list(inputs), "weights": [1]},
+        {"id": "ping", "op": "ping"},
+        {"id": "sweep", "op": "sweep", "inputs": list(inputs), "steps": 3},
+    ]
+
+    async def exchange():
+        server = await asyncio.start_unix_server(service.handle, path)
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(b"".join(json.dumps(request).encode("utf-8") + b"\n" for request in requests))
+            await writer.drain()
+            replies = [json.loads(await reader.readline()) for _ in requests]
+            writer.close()
+            await writer.wait_closed()
+        return {reply["id"]: reply for reply in replies}
+
+    replies = asyncio.run(exchange())
+    assert replies["ping"] == {"id": "ping", "ok": True}
+    assert blended_value(replies["half"]["xml"]) == 0.5
+    assert replies["bad"]["ok"] is False and "weights" in replies["bad"]["error"]
+    assert [blended_value(xml) for xml in replies["sweep"]["xml"]] == [1.0, 0.5, 0.0]
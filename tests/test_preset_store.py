@@ -0,0 +1,28 @@
+import numpy as np
+
+from preset_library import PresetRecord
+from preset_store import PresetStore, export_store
+
+
+def record(name, values, node_properties=None):
+    return PresetRecord(name, f"{name}.xml", f"uuid-{name}", ("A", "B"), np.array(values, dtype=float), node_properties)
+
+
+def test_store_round_trips_records_by_condition(tmp_path):
+    # user-019
+    library = {
+        "Filter": {"Soft": [record("a", [[1, 2], [3, 4]]), record("b", [[5, 6], [7, 8]], {"PositiveDistType": "2"})]},
+        "Polar Distortion": {"Hard": [record("ç", [[0, 1], [1, 0]])]},
+    }
+    assert export_store(tmp_path / "store", library) == 3
+
+    store = PresetStore(tmp_path / "store")
+    assert len(store) == 3
+    assert store.categories_and_conditions() == {"Filter": ["Soft"], "Polar Distortion": ["Hard"]}
+    for category, conditions in library.items():
+        for condition, records in conditions.items():
+            loaded = store.load_condition(category, condition)
+            assert [(r.name, r.path, r.uuid, r.tags, r.node_properties) for r in loaded] == \
+                [(r.name, r.path, r.uuid, r.tags, r.node_properties) for r in records]
+            assert all(np.array_equal(a.values, b.values) for a, b in zip(loaded, records))
+    assert store.load_condition("Filter", "Missing") == []
@@ -0,0 +1,61 @@
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from preset_writer import ArchiveWriter, release_placeholders, reserve_path, reserve_paths, write_atomic
+
+
+def test_racing_reservations_claim_distinct_names(tmp_path):
+    # user-017
+    def claim(_):
+        return reserve_paths(str(tmp_path), "blended", range(1, 11))
+
+    with ThreadPoolExecutor(8) as pool:
+        claimed = [path for reserved in pool.map(claim, range(8)) for path, _ in reserved]
+    assert len(claimed) == len(set(claimed)) == 80
+    assert sorted(os.listdir(tmp_path)) == sorted(f"blended_{counter}.xml" for counter in range(1, 81))
+
+
+def test_reserve_paths_skips_names_taken_since_they_were_suggested(tmp_path):
+    # user-017
+    (tmp_path / "blended_2.xml").write_text("taken")
+    reserved = reserve_paths(str(tmp_path), "blended", [1, 2, 3])
+    assert [counter for _, counter in reserved] == [1, 3, 4]
+    assert reserve_path(str(tmp_path), "blended") == (str(tmp_path / "blended_5.xml"), 5)
+    assert (tmp_path / "blended_2.xml").read_text() == "taken"
+
+
+def test_release_placeholders_keeps_written_presets(tmp_path):
+    # user-017
+    (written, _), (unused, _) = reserve_paths(str(tmp_path), "blended", [1, 2])
+    write_atomic(written, "<SubPreset/>")
+    release_placeholders([written, unused])
+    assert os.listdir(tmp_path) == ["blended_1.xml"]
+
+
+def test_write_atomic_replaces_without_leaving_temporary_files(tmp_path):
+    # user-017
+    path = tmp_path / "new" / "preset.xml"
+    write_atomic(str(path), "first", make_dirs=True)
+    write_atomic(str(path), "second")
+    assert path.read_text() == "second"
+    assert os.listdir(path.parent) == ["preset.xml"]
+
+
+def test_archive_writer_publishes_only_complete_archives(tmp_path):
+    # user-017
+    path = tmp_path / "run.zip"
+    with ArchiveWriter(str(path)) as archive:
+        archive.add("Filter/a.xml", "a")
+        with pytest.raises(ValueError):
+            archive.add("Filter/a.xml", "again")
+    with zipfile.ZipFile(path) as published:
+        assert published.namelist() == ["Filter/a.xml"]
+
+    with pytest.raises(RuntimeError):
+        with ArchiveWriter(str(tmp_path / "failed.zip")) as archive:
+            archive.add("Filter/b.xml", "b")
+            raise RuntimeError("worker failed")
+    assert sorted(os.listdir(tmp_path)) == ["run.zip"]